@@ -39,6 +39,11 @@ import os
 import time
 
 import json
+"""
+the heavy dependencies (scipy, sklearn, RegscorePy, matplotlib, weasyprint) are imported by elisa_tool_repo
+only when a fit, plot or report is requested; the import time of the plugin modules is checked in setup()
+"""
+_import_start = time.time()
 import numpy as np
 import pandas as pd
 import elisa_tool_repo.et_parse_func as epf
@@ -46,6 +51,8 @@ import elisa_tool_repo.validation_func as vf_lib
 import elisa_tool_repo.high_lev_func as hl_1
 import elisa_tool_repo.et_calc as ecf
 import elisa_tool_repo.pdf_creator as pdf
+import elisa_tool_repo.et_cache as etc
+PLUGIN_IMPORT_TIME = time.time() - _import_start
 
 try:
     from tkinter.ttk import *
@@ -158,7 +165,7 @@ class elisaPlugin(Plugin):
                                                  state='readonly',
                                                  textvariable=self.choiceVar)
         self.methodChooseCombobox.grid(column='0', row='1')
-        list_itemsA = ["cf4PL", "cf5PL", "cfLN", "4PL", "5PL", "LN"]
+        list_itemsA = ["cf4PL", "cf5PL", "cfLN", "4PL", "5PL", "LN", "h4PL", "h5PL", "hLN", "auto"]
         self.methodChooseCombobox['values'] = list_itemsA
         self.methodChooseCombobox.set(list_itemsA[0])
         self.methodChooseFrame.grid(column='0', row='0')
@@ -505,6 +512,24 @@ class elisaPlugin(Plugin):
         conf_file = open('pandastable/plugins/elisa_tool_repo/elisa-tool.conf')
         conf_str = conf_file.read()
         self.etConfig = json.loads(conf_str)
+        if PLUGIN_IMPORT_TIME > self.etConfig.get("import_budget_s", float("inf")):
+            print("ELISA tool: plugin modules imported in %.2f s, budget is %.2f s"
+                  % (PLUGIN_IMPORT_TIME, self.etConfig["import_budget_s"]))
+        """
+        cache of the parsed plates (re-runs on the same files skip Excel parsing)
+        """
+        self.plateCache = None
+        if "cache" in self.etConfig:
+            self.plateCache = etc.PlateCache(folder=self.etConfig["cache"]["folder"],
+                                             max_bytes=self.etConfig["cache"]["max_mb"]*1024*1024)
+        """
+        warm-start store of the accepted curve parameters (fits of the same assay start from them)
+        """
+        self.fitStore = None
+        if "fit_store" in self.etConfig:
+            self.fitStore = etc.FitStore(path=self.etConfig["fit_store"]["file"],
+                                         max_sets=self.etConfig["fit_store"]["max_sets"],
+                                         max_age_days=self.etConfig["fit_store"]["max_age_days"])
         """
         set default parametres in plot tool 
         """
@@ -638,12 +663,12 @@ class elisaPlugin(Plugin):
         examp_run = self.methodChooseCombobox.get()
         print("Before if examp_run: ", examp_run)
         
-        if ((examp_run == "LN") or (examp_run == "cfLN")):
+        if (ecf.model_family(examp_run) == "LN"):
             self.etConfig[examp_run] = {"A": [float(self.paramAfrom.get()),
                                               float(self.paramAto.get())],
                                         "B": [float(self.paramBfrom.get()),
                                               float(self.paramBto.get())]}
-        if ((examp_run == "4PL") or (examp_run == "cf4PL")):
+        if (ecf.model_family(examp_run) == "4PL"):
             self.etConfig[examp_run] = {"A": [float(self.paramAfrom.get()),
                                               float(self.paramAto.get())],
                                         "B": [float(self.paramBfrom.get()),
@@ -652,7 +677,7 @@ class elisaPlugin(Plugin):
                                               float(self.paramCto.get())],
                                         "D": [float(self.paramDfrom.get()),
                                               float(self.paramDto.get())]}
-        if ((examp_run == "5PL") or (examp_run == "cf5PL")):
+        if (ecf.model_family(examp_run) == "5PL"):
             self.etConfig[examp_run] = {"A": [float(self.paramAfrom.get()),
                                               float(self.paramAto.get())],
                                         "B": [float(self.paramBfrom.get()),
@@ -664,36 +689,52 @@ class elisaPlugin(Plugin):
                                         "E": [float(self.paramEfrom.get()),
                                               float(self.paramEto.get())]}
         print("After setup if examp_run: ", examp_run)
+        if examp_run == "auto":
+            """auto mode: all of the candidate models are fitted with their ranges from elisa-tool.conf"""
+            param_range = dict(self.etConfig["auto"],
+                               ranges={order: self.etConfig[order] for order in self.etConfig["auto"]["candidates"]})
+        elif "val" not in examp_run:
+            param_range = self.etConfig[examp_run]
            
         if "val" not in examp_run:
             try:
-                run_step_1 = hl_1.parse_input_data(Fpath_tekan = path_rd, Fpath_config = path_st)
+                plates = hl_1.parse_input_plates(Fpath_tekan = path_rd, Fpath_config = path_st, cache = self.plateCache)
             except EOFError:
                 print("Something goes wrong:")
+
+            if len(plates) > 1:
+                """Multi-plate TEKAN workbook: all of the plates are fitted and reported as one batch."""
+                hl_1.batch_report(plates=plates, order=examp_run, param_range=param_range,
+                                  res_folder=res_fol, r_name='Raport_', licence_notice=self.etConfig["licence_notice"],
+                                  de_options=self.etConfig.get("DE"), fit_store=self.fitStore,
+                                  boot_options=self.etConfig.get("bootstrap"))
+                self.labelCalcuateStatus["text"] = "completed %d plates" % len(plates)
+                return
+            run_step_1 = plates[0][1]
             
-            """         0         1               2               3                 4           5           6
-            output: (meas_res, data_map, data_standards, data_standards_for_rep, pdf_leg, specification, dat_model)
+            """         0         1               2               3                 4           5           6          7
+            output: (meas_res, data_map, data_standards, data_standards_for_rep, pdf_leg, specification, dat_model, plate)
             """   
             ### !!!!!!!!!!!!!!!!!!!!!
-            (df_colect_data, flag) = ecf.recognition_experiment(imp_data=run_step_1[0], imp_data_map=run_step_1[1], d_st=run_step_1[3])
+            (df_colect_data, flag) = ecf.recognition_experiment(imp_data=run_step_1[0], imp_data_map=run_step_1[1], d_st=run_step_1[3],
+                                                                 plate=run_step_1[7])
             """         0         1               2               3                 4           5           6
             output: (df_local, flag) - DF with data samples, std and other, flag - recognized experiment: STD (standard ELISA), SPC -JS exp.
             """   
             
             start_time = time.time()
-            run_step_2 = hl_1.interpolation_eng(dat_model=run_step_1[6], order=examp_run, param_range=self.etConfig[examp_run])
+            run_step_2 = hl_1.interpolation_eng(dat_model=run_step_1[6], order=examp_run, param_range=param_range,
+                                                de_options=self.etConfig.get("DE"), fit_store=self.fitStore,
+                                                legend=run_step_1[4])
+            """in the auto mode the report is generated for the best model only"""
+            examp_run = hl_1.fitted_order(run_step_2, examp_run)
             """         0
             output: (par_model)
             """
             end_time = time.time()
             calc_time = end_time - start_time
-            ind_x = [ind_x for ind_x in run_step_2 if 'Error' in ind_x][0]
-            ind_error = run_step_2.index(ind_x)
-            """
-            Looking for index in multidim array (index() dosn'r work for this case). Above 2 lines working, bu=t i've no idea how...
-            """
-            print("ind_error: ", ind_error)
-            if(run_step_2[ind_error][1] == 0):
+            print("Error flag: ", run_step_2.error)
+            if(run_step_2.error == 0):
                 """Calculation without errors."""
                 res_name = 'Raport_'
                 (x_theor, y_theor, x_std, y_std, x_sam,  y_sam) = hl_1.make_report(
@@ -711,7 +752,10 @@ class elisaPlugin(Plugin):
                                     pdf_leg=run_step_1[4],
                                     licence_notice=self.etConfig["licence_notice"],
                                     order_model=examp_run,
-                                    cal_time=calc_time)
+                                    cal_time=calc_time,
+                                    plate=run_step_1[7],
+                                    bootstrap=hl_1.bootstrap_eng(run_step_1, run_step_2, examp_run, param_range,
+                                                                 self.etConfig.get("bootstrap")))
                 """
                 input:           (std_mat, X_std, Y_std, param, 
                                     res_folder, r_name, 
@@ -736,14 +780,9 @@ class elisaPlugin(Plugin):
             else:
                 """Error in calculation. Send a warrinig."""
                 #print("Bug w obliczeniach!!!")
-                if(run_step_2[ind_error][1] == 1):
-                    error_info = "Err: too small bound of parameter changes for method, parameter=bound"
-                ind_x = [ind_x for ind_x in run_step_2 if 'RSS' in ind_x][0]
-                ind_error = run_step_2.index(ind_x)
-                if(run_step_2[ind_error][1] > 0.3):
-                    error_info = "Err: too small bound of parameter changes for method, RSS error"
+                error_info = hl_1.fit_error_info(run_step_2)
                 self.labelCalcuateStatus["text"] = "Err: check *error.csv"
-                pdf.rep_error_csv(rep_name='Raport_', p_folder=res_fol , parameters=run_step_2, order=examp_run, error_info)
+                pdf.rep_error_csv(rep_name='Raport_', p_folder=res_fol , parameters=run_step_2, order=examp_run, error_info=error_info)
                 
             mainloop()
             
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Created on October 2026
+@author:  Marek Bawiec, Grzegorz Banach
+The ELISA tool plugin: module containing the bootstrap of the calibration curve and of the sample concentrations.
+"""
+
+__author__ = "Marek Bawiec, Grzegorz Banach"
+__copyright__ = "Copyright 2019, Physiolution Polska"
+__credits__ = [""]
+__license__ = "GPL"
+__version__ = "0.0.1"
+__maintainer__ = "Grzegorz Banach"
+__email__ = "g.banach@physiolution.pl"
+__status__ = "Production"
+
+import time
+import warnings
+from multiprocessing import Pool, TimeoutError
+import numpy as np
+import pandas as pd
+import elisa_tool_repo.et_optim as eto
+
+"""
+Default bootstrap settings, used for the settings missing in the "bootstrap" section of elisa-tool.conf:
+replicates - number of bootstrap replicates (resampled plates), 0 (default) switches the bootstrap off,
+             so the reports run without the bootstrap unless it is asked for
+batch - replicates fitted at once by one job (et_optim.batch_least_squares)
+workers - number of processes running the batches (1 - in the calling process)
+time_budget_s - no new batches are collected after this time, the summary uses the finished replicates
+                (the first batch is always finished)
+seed - seed of the random streams (None - new seed every run), batch k draws from RandomState([seed, k])
+percentiles - lower and upper percentile of the bootstrap intervals
+min_converged - smallest fraction of the refits that have to converge, otherwise the bootstrap is invalid
+                (the intervals of the converged refits only would be too narrow); also the smallest fraction of the
+                refits in which a sample has to be back-calculated (in the range of the refitted curve), otherwise
+                the interval of the sample is NaN with the error flag
+"""
+BOOT_BUDGET = {'replicates': 0, 'batch': 250, 'workers': 1, 'time_budget_s': 10.0, 'seed': None,
+               'percentiles': [2.5, 97.5], 'min_converged': 0.9}
+
+def boot_settings(boot_options=None):
+    """returns dictionary with the bootstrap settings: BOOT_BUDGET overridden by boot_options ("bootstrap" section of the conf)"""
+    settings = dict(BOOT_BUDGET)
+    settings.update(boot_options or {})
+    return settings
+
+def replicate_wells(plate, labels):
+    """returns list of the absorbance arrays of the replicates of every label (et_plate.Plate.values)"""
+    return [plate.values(label) for label in labels]
+
+def resampled_means(rng, wells, n_boot):
+    """
+    The function implemented to resample the replicates of every label with replacement (n_boot times at once).
+    returns array (n_boot x number of labels) of the means of the resampled replicates
+    """
+    means = np.empty((n_boot, len(wells)))
+    for j, values in enumerate(wells):
+        means[:, j] = values[rng.randint(len(values), size=(n_boot, len(values)))].mean(axis=1)
+    return means
+
+def boot_batch(job):
+    """
+    The function implemented to run one batch of the bootstrap (also as the job of the process pool):
+    the replicates of the standards are resampled and all of the resampled curves are refitted at once
+    (et_optim.batch_least_squares warm-started from the base fit), then the resampled means of the samples
+    are back-calculated with the refitted parameters. Curves that did not converge are dropped (and counted).
+    Function input job: (model, X, std_wells, sam_wells, p0, bounds, seed, n_boot)
+    returns (P - array n x n_par of the parameters, conc - array n x number of samples of the concentrations,
+             n_boot - number of the refitted curves, converged or not)
+    """
+    model, X, std_wells, sam_wells, p0, bounds, seed, n_boot = job
+    rng = np.random.RandomState(seed)
+    Y = resampled_means(rng, std_wells, n_boot)
+    P, rss, nit, converged = eto.batch_least_squares(model, np.tile(X, (n_boot, 1)), Y, np.tile(p0, (n_boot, 1)), bounds)
+    Y_sam = resampled_means(rng, sam_wells, n_boot)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        conc = eto.INVERSES[model](P, Y_sam)
+    return P[converged], conc[converged], n_boot
+
+def boot_jobs(model, X, std_wells, sam_wells, p0, bounds, settings):
+    """returns list of the batch jobs (boot_batch) with independent random streams RandomState([seed, k])"""
+    seed = settings['seed']
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+    replicates = int(settings['replicates'])
+    batch = max(1, int(settings['batch']))
+    return [(model, X, std_wells, sam_wells, p0, bounds, [int(seed), k], min(batch, replicates - start))
+            for k, start in enumerate(range(0, replicates, batch))]
+
+def collect_batches(jobs, workers, time_budget):
+    """
+    The function implemented to run the batch jobs (in the process pool if workers > 1) and to collect the results
+    as they finish until all of the jobs are done or the time budget [s] is used (the first batch is always waited for).
+    returns list of the results of boot_batch
+    """
+    start_time = time.time()
+    results = []
+    if workers <= 1:
+        for job in jobs:
+            results.append(boot_batch(job))
+            if time.time() - start_time > time_budget:
+                break
+        return results
+    pool = Pool(min(workers, len(jobs)))
+    try:
+        batches = pool.imap_unordered(boot_batch, jobs)
+        for k in range(len(jobs)):
+            timeout = None if not results else max(time_budget - (time.time() - start_time), 0.0)
+            try:
+                results.append(batches.next(timeout=timeout))
+            except TimeoutError:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+def percentile_table(values, names, percentiles, min_finite=0.0):
+    """
+    The function implemented to summarize the bootstrap values (n x number of names) column by column.
+    A value is NaN when the refit gives no result for the column (e.g. sample outside of the range of the refitted curve),
+    the percentiles of the finite values only would be too narrow, so below min_finite of the finite values the interval
+    of the column is NaN and its error flag is 1.
+    returns DataFrame: name -> lower, median, upper percentile, finite (fraction of the finite values), error
+    """
+    values = np.asarray(values, dtype='float64').reshape(-1, len(names))
+    finite = np.isfinite(values).mean(axis=0) if len(values) else np.zeros(len(names))
+    error = finite < min_finite
+    lower, median, upper = np.full((3, len(names)), np.nan)
+    if len(values):
+        with warnings.catch_warnings():
+            """columns without any finite value give the NaN percentiles"""
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lower, median, upper = np.nanpercentile(values, [percentiles[0], 50.0, percentiles[1]], axis=0)
+    lower, median, upper = [np.where(error, np.nan, q) for q in (lower, median, upper)]
+    return pd.DataFrame({'lower': lower, 'median': median, 'upper': upper, 'finite': finite, 'error': error.astype(int)},
+                        index=pd.Index(names, name='name'), columns=['lower', 'median', 'upper', 'finite', 'error'])
+
+def bootstrap(plate, d_st, fit, bounds, boot_options=None):
+    """
+    The function implemented to estimate the bootstrap intervals of the model parameters and of the concentrations
+    of all of the samples of the plate. The replicates of the standards and of the samples are resampled, every
+    resampled curve is refitted from the base fit and the percentiles of the refitted parameters and back-calculated
+    concentrations are reported.
+    Function input:
+    plate - et_plate.Plate
+    d_st - DataFrame with calibration standards (output of et_calc.data_st_to_print), standards with conc = 0 are skipped
+    fit - FitResult of the base fit (start point of all of the refits)
+    bounds - list of (min, max) pairs of the parameters ranges (in the order of fit.names)
+    boot_options - "bootstrap" section of elisa-tool.conf (boot_settings)
+    returns dictionary with replicates (number of the refits used for the intervals, 0 if invalid), converged,
+    attempted (number of the refits run within the time budget), requested, valid (at least min_converged of the attempted refits converged),
+    calc_time, percentiles and DataFrames params and concentration (parameter or sample -> lower, median, upper,
+    finite, error: percentile_table with min_converged); the intervals of an invalid bootstrap are NaN.
+    Returns None if the bootstrap is switched off.
+    """
+    settings = boot_settings(boot_options)
+    if int(settings['replicates']) <= 0:
+        return None
+    start_time = time.time()
+    std_names = [name for name in d_st.index if d_st.conc[name] != 0]
+    sam_names = [label for label in plate.labels_by_position() if 'sam' in label]
+    X = d_st.conc[std_names].values.astype('float64')
+    jobs = boot_jobs(fit.model, X, replicate_wells(plate, std_names), replicate_wells(plate, sam_names), fit.params,
+                     bounds, settings)
+    results = collect_batches(jobs, int(settings['workers']), float(settings['time_budget_s']))
+    P = np.concatenate([P for P, conc, n_boot in results])
+    conc = np.concatenate([conc for P, conc, n_boot in results])
+    attempted = sum(n_boot for P, conc, n_boot in results)
+    converged = len(P)
+    valid = converged > 0 and converged >= float(settings['min_converged'])*attempted
+    if not valid:
+        P, conc = P[:0], conc[:0]
+    percentiles = settings['percentiles']
+    """returns bootstrap summary"""
+    return {'replicates': len(P), 'converged': converged, 'attempted': attempted, 'requested': int(settings['replicates']),
+            'valid': valid, 'calc_time': time.time() - start_time, 'percentiles': percentiles,
+            'params': percentile_table(P, fit.names, percentiles, float(settings['min_converged'])),
+            'concentration': percentile_table(conc, sam_names, percentiles, float(settings['min_converged']))}
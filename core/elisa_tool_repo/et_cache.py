@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Created on October 2026
+@author:  Marek Bawiec, Grzegorz Banach
+The ELISA tool plugin: module containing on-disk cache of the parsed input data.
+"""
+
+__author__ = "Marek Bawiec, Grzegorz Banach"
+__copyright__ = "Copyright 2019, Physiolution Polska"
+__credits__ = [""]
+__license__ = "GPL"
+__version__ = "0.0.1"
+__maintainer__ = "Grzegorz Banach"
+__email__ = "g.banach@physiolution.pl"
+__status__ = "Production"
+
+import hashlib
+import json
+import numbers
+import os
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+
+"""
+Version of the stored layout, change it whenever the output of the extractors changes
+"""
+CACHE_FORMAT = "4"
+
+"""
+Tables stored for every workbook pair (outputs of extract_data_map, extract_data_standards and get_full_specification),
+the measurement tables (extract_meas_res) are stored separately for every plate of the TEKAN workbook
+"""
+CACHED_FRAMES = ['data_map', 'data_standards', 'specification']
+
+def file_hash(filepath, hasher=None):
+    """
+    The function implemented to calculate the content hash of a file.
+    """
+    if hasher is None:
+        hasher = hashlib.sha1()
+    with open(filepath, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher
+
+def _to_arrays(name, values):
+    """
+    The function implemented to store values as plain arrays, so the cache is loaded without unpickling (allow_pickle=False):
+    strings are stored as fixed-width unicode arrays, numbers as float arrays, other data keep their dtype.
+    Object arrays mixing strings and numbers (e.g. empty cells read as NaN) are stored as the unicode array name with the float
+    array name__num and the mask name__is_num of the numeric cells; other objects (e.g. dates) are stored as strings.
+    returns dictionary: array name -> array
+    """
+    arr = np.asarray(values)
+    if arr.dtype != object:
+        return {name: arr}
+    cells = arr.ravel()
+    is_num = np.array([v is None or isinstance(v, numbers.Number) for v in cells], dtype=bool)
+    num = np.array([float(v) if (n and v is not None) else np.nan for v, n in zip(cells, is_num)], dtype='float64')
+    if is_num.all():
+        return {name: num.reshape(arr.shape)}
+    text = np.array(['' if n else str(v) for v, n in zip(cells, is_num)], dtype=str).reshape(arr.shape)
+    if not is_num.any():
+        return {name: text}
+    return {name: text, name + '__num': num.reshape(arr.shape), name + '__is_num': is_num.reshape(arr.shape)}
+
+def _from_arrays(name, arrays):
+    """
+    The function implemented to rebuild the values stored with _to_arrays (strings as object array).
+    """
+    arr = arrays[name]
+    if arr.dtype.kind == 'U':
+        arr = arr.astype(object)
+    if name + '__is_num' in arrays.files:
+        is_num = arrays[name + '__is_num']
+        arr[is_num] = arrays[name + '__num'][is_num]
+    return arr
+
+def _frame_to_arrays(name, frame):
+    """
+    The function implemented to split a DataFrame into plain arrays suitable for the npz-format.
+    """
+    index_name = frame.index.name
+    arrays = {name + '__index_name': np.array('' if index_name is None else str(index_name))}
+    arrays.update(_to_arrays(name + '__values', frame.values))
+    arrays.update(_to_arrays(name + '__index', list(frame.index)))
+    arrays.update(_to_arrays(name + '__columns', list(frame.columns)))
+    return arrays
+
+def _arrays_to_frame(name, arrays):
+    """
+    The function implemented to rebuild a DataFrame stored with _frame_to_arrays.
+    """
+    index_name = str(arrays[name + '__index_name'])
+    index = pd.Index(_from_arrays(name + '__index', arrays).tolist(), name=(index_name if index_name else None))
+    return pd.DataFrame(_from_arrays(name + '__values', arrays), index=index,
+                        columns=_from_arrays(name + '__columns', arrays).tolist())
+
+
+class PlateCache(object):
+    """
+    The class implemented to keep the parsed plates in the folder as npz-files named by the content hash of the input files.
+    The folder is bounded by max_bytes, the least recently used plates are removed first.
+    Class input:
+    folder - cache folder (created if absent)
+    max_bytes - maximal size of the cache folder
+    """
+    def __init__(self, folder, max_bytes=200 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    def key(self, Fpath_tekan, Fpath_config):
+        """returns the content hash of the (TEKAN, config) pair"""
+        hasher = hashlib.sha1(CACHE_FORMAT.encode('utf-8'))
+        file_hash(Fpath_tekan, hasher)
+        hasher.update(b'|')
+        file_hash(Fpath_config, hasher)
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + '.npz')
+
+    def load(self, key):
+        """
+        returns dictionary with plates, meas_res, data_map, data_standards, pdf_leg and specification or None if the plate is not cached
+        """
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            """the folder may be shared: plain arrays only, a file with pickled objects fails to load"""
+            with np.load(path, allow_pickle=False) as arrays:
+                parsed = {name: _arrays_to_frame(name, arrays) for name in CACHED_FRAMES}
+                parsed['pdf_leg'] = dict(zip(_from_arrays('pdf_leg__keys', arrays).tolist(),
+                                             _from_arrays('pdf_leg__values', arrays).tolist()))
+                parsed['plates'] = [(plate_id, _arrays_to_frame('plate' + str(n), arrays))
+                                    for n, plate_id in enumerate(_from_arrays('plates__ids', arrays).tolist())]
+                parsed['meas_res'] = parsed['plates'][0][1]
+        except (IOError, OSError, EOFError, KeyError, ValueError, IndexError, TypeError, zipfile.BadZipFile):
+            """damaged, stale or tampered entry: cache miss, parse the workbooks again"""
+            remove_quietly(path)
+            return None
+        """mark as recently used"""
+        os.utime(path, None)
+        return parsed
+
+    def store(self, key, parsed):
+        """
+        The function implemented to save parsed plate and to keep the cache size in bounds.
+        """
+        arrays = {}
+        for name in CACHED_FRAMES:
+            arrays.update(_frame_to_arrays(name, parsed[name]))
+        legend = parsed['pdf_leg']
+        arrays.update(_to_arrays('pdf_leg__keys', list(legend.keys())))
+        arrays.update(_to_arrays('pdf_leg__values', [legend[k] for k in legend]))
+        for n, (plate_id, meas_res) in enumerate(parsed['plates']):
+            arrays.update(_frame_to_arrays('plate' + str(n), meas_res))
+        arrays.update(_to_arrays('plates__ids', [plate_id for plate_id, meas_res in parsed['plates']]))
+        path = self._path(key)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        The function implemented to remove the least recently used plates until the cache fits into max_bytes.
+        """
+        entries = []
+        for f_name in os.listdir(self.folder):
+            if f_name.endswith('.npz') and not f_name.endswith('.tmp.npz'):
+                path = os.path.join(self.folder, f_name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            remove_quietly(path)
+            total = total - size
+
+
+class FitStore(object):
+    """
+    The class implemented to keep the last accepted curve parameters of every assay (SOP_name and TEMPLATE_version
+    of the pdf legend) and model order in a json-file, so the next fit of the same kit starts from them (warm start).
+    Rejected fits (Error=1) remove the stored sets of the assay, sets older than max_age_days are dropped.
+    Class input:
+    path - json-file of the store (created on the first record)
+    max_sets - number of the parameter sets kept for every assay and order
+    max_age_days - age of the stale sets (0 - sets never get stale)
+    """
+    def __init__(self, path, max_sets=5, max_age_days=90):
+        self.path = path
+        self.max_sets = max_sets
+        self.max_age_days = max_age_days
+        self.fits = {}
+        try:
+            with open(path) as f_in:
+                self.fits = json.load(f_in)
+        except (IOError, OSError, ValueError):
+            """no store yet or damaged file, all fits start cold"""
+            self.fits = {}
+
+    @staticmethod
+    def key(legend, order):
+        """returns the store key of the assay (pdf legend with SOP_name and TEMPLATE_version) and the model order"""
+        return '|'.join([str(legend.get('SOP_name')), str(legend.get('TEMPLATE_version')), order])
+
+    def prior(self, key):
+        """returns array (n_sets x n_par) of the fresh accepted parameters of the key or None"""
+        entries = self.fits.get(key, [])
+        if self.max_age_days > 0:
+            oldest = time.time() - self.max_age_days*86400.0
+            entries = [e for e in entries if e['time'] >= oldest]
+        if not entries:
+            return None
+        return np.array([e['par'] for e in entries], dtype='float64')
+
+    def record(self, key, par, error):
+        """
+        The function implemented to store accepted parameters (error=0) or to evict the key after a rejected fit (error=1).
+        """
+        if error:
+            if self.fits.pop(key, None) is None:
+                return
+        else:
+            entries = self.fits.setdefault(key, [])
+            entries.append({'time': time.time(), 'par': [float(v) for v in par]})
+            del entries[:-self.max_sets]
+        self.save()
+
+    def save(self):
+        """writes the store (atomic replace of the json-file)"""
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f_out:
+            json.dump(self.fits, f_out)
+        os.replace(tmp_path, self.path)
+
+def remove_quietly(path):
+    """
+    Removes a file, a missing file is not an error.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -17,12 +17,9 @@ __status__ = "Production"
 
 import numpy as np
 import pandas as pd
-import copy
-from scipy.optimize import differential_evolution
-from sklearn.metrics import r2_score
-from scipy.optimize import curve_fit
-from scipy.stats import pearsonr
-from RegscorePy import *
+import elisa_tool_repo.et_plate as etp
+import elisa_tool_repo.et_optim as eto
+from elisa_tool_repo.et_result import FitResult
 
 def max_concentration(res_sam_mat, std_mat):
     """
@@ -80,58 +77,235 @@ def theor_X(res_sam_mat, std_mat):
     #returns list of titer concentration valuesfor further calculations of theoretical curve
     return X_t
     
-def data_st_to_print (imp_data, imp_data_map, data_standards):
+def plate_of(imp_data, imp_data_map, plate=None):
+    """
+    returns the et_plate.Plate of the measurement results, built from the DataFrames if not given
+    """
+    if plate is None:
+        plate = etp.Plate.from_frames(meas_res=imp_data, data_map=imp_data_map)
+    return plate
+
+def replicate_means(imp_data, imp_data_map, plate=None):
+    """
+    The function implemented to average the replicates of every label of the multiwell plate map.
+    Function input:
+    imp_data - DataFrame with initial measurement results
+    imp_data_map - DataFrame with multiwell plate map of the same plate format
+    plate - et_plate.Plate of the same measurement (optional, built here if not given)
+    """
+    plate = plate_of(imp_data, imp_data_map, plate)
+    counts, means, stds = plate.replicate_stats()
+    """returns Series: label -> mean absorbance (sorted by label)"""
+    return pd.Series(means.copy(), index=pd.Index(list(plate.labels), name='label'))
+
+def replicate_table(plate, d_st):
+    """
+    The function implemented to collect the replicates statistics of every label of the plate in one table.
+    Rows are ordered by the first well of the label on the plate, the standards get their concentration from d_st
+    and Errors=100.
+    Function input:
+    plate - et_plate.Plate
+    d_st - DataFrame with calibration standards (output of data_st_to_print)
+    """
+    counts, means, stds = plate.replicate_stats()
+    codes = plate.codes_by_position()
+    names = [plate.labels[c] for c in codes]
+    is_std = np.array([('std' in g) for g in names], dtype=bool)
+    X_concentration = np.full(len(names), np.nan)
+    X_concentration[is_std] = d_st.conc.reindex([g for g in names if 'std' in g]).values
+    Errors = np.where(is_std, 100.0, np.nan)
+    """returns DataFrame: label -> samples_nb, Y_ave_abs, Y_abs_std, X_concentration, X_s_conc_std_bottom, X_s_conc_std_upper,
+       X_s_conc_ci_bottom, X_s_conc_ci_upper, Errors"""
+    return pd.DataFrame({'samples_nb': counts[codes], 'Y_ave_abs': means[codes], 'Y_abs_std': stds[codes],
+                         'X_concentration': X_concentration, 'X_s_conc_std_bottom': np.full(len(names), np.nan),
+                         'X_s_conc_std_upper': np.full(len(names), np.nan), 'X_s_conc_ci_bottom': np.full(len(names), np.nan),
+                         'X_s_conc_ci_upper': np.full(len(names), np.nan), 'Errors': Errors},
+                        index=pd.Index(names, name='Y_names'),
+                        columns=['samples_nb', 'Y_ave_abs', 'Y_abs_std', 'X_concentration', 'X_s_conc_std_bottom',
+                                 'X_s_conc_std_upper', 'X_s_conc_ci_bottom', 'X_s_conc_ci_upper', 'Errors'])
+
+def data_st_to_print (imp_data, imp_data_map, data_standards, plate=None):
     """
     The function used to generate an ordered DataFrame with initial measuremnt results.
     """
-    g1=imp_data_map.stack()
-    g2=set(g1)
-    for g in g2:
-        vars()[g]=[]
-        
-    imp_columns=list(imp_data.columns.values)
-    imp_index=list(imp_data.index.values)
-    
-    for c_name in imp_columns:
-        for r_name in imp_index:
-            vars()[imp_data_map.loc[r_name][c_name]].append(imp_data.loc[r_name][c_name])
-    sample=[]        
-    X_st=[]
-    Y_st=[]
-    
-    for g in g2:
-        vars()[g]=sum(vars()[g]) / float(len(vars()[g]))
-        if ('std' in g):
-            sample.append(g)
-            X_st.append(data_standards.loc[g]['values'])
-            Y_st.append(vars()[g])
-            continue
-        else:
-            continue
+    ave_abs = replicate_means(imp_data=imp_data, imp_data_map=imp_data_map, plate=plate)
+    sample = [g for g in ave_abs.index if 'std' in g]
     
     result=pd.DataFrame()
     result["name"]=sample
-    result["conc"]=X_st
-    result["absorbance"]=Y_st
+    result["conc"]=[data_standards.loc[g]['values'] for g in sample]
+    result["absorbance"]=ave_abs[sample].values
     
     result.sort_values(by=["name"], inplace=True)
     result.set_index(['name'], inplace=True)
     """returns DataFrame with extended table of data about calibration standards: (std_name,concentration, abs_ave) """
     return (result)
         
+"""
+Default search budget of the differential evolution fits, used for the settings missing in the "DE" section of elisa-tool.conf:
+popsize - population size per model parameter (population = popsize*number_of_parameters)
+maxiter - maximal number of generations
+tol - relative spread of the population energies that ends the search
+stall_generations, stall_rtol - the search ends when the best RSS improved by less than stall_rtol (relative)
+                                for stall_generations generations in a row
+spread_tol - the search ends when the population spread (in units of the parameter ranges) drops below spread_tol
+"""
+DE_BUDGET = {'LN':  {'popsize': 10, 'maxiter': 2000, 'tol': 0.01, 'stall_generations': 100, 'stall_rtol': 1e-9, 'spread_tol': 1e-7},
+             '4PL': {'popsize': 15, 'maxiter': 5000, 'tol': 0.01, 'stall_generations': 300, 'stall_rtol': 1e-9, 'spread_tol': 1e-7},
+             '5PL': {'popsize': 20, 'maxiter': 5000, 'tol': 0.01, 'stall_generations': 300, 'stall_rtol': 1e-9, 'spread_tol': 1e-7},
+             'hLN':  {'popsize': 5, 'maxiter': 100, 'tol': 0.05, 'stall_generations': 20, 'stall_rtol': 1e-6, 'spread_tol': 1e-4},
+             'h4PL': {'popsize': 8, 'maxiter': 150, 'tol': 0.05, 'stall_generations': 30, 'stall_rtol': 1e-6, 'spread_tol': 1e-4},
+             'h5PL': {'popsize': 10, 'maxiter': 200, 'tol': 0.05, 'stall_generations': 30, 'stall_rtol': 1e-6, 'spread_tol': 1e-4}}
+
+def de_settings(de_options=None, model='5PL'):
+    """
+    The function implemented to read the differential evolution settings ("DE" section of elisa-tool.conf):
+    workers - number of processes scoring the population (1 - no pool)
+    seed - seed of the random generator (null - a new search every run), the same seed gives the same fit
+    LN, 4PL, 5PL - search budget of the model (see DE_BUDGET)
+    hLN, h4PL, h5PL - budget of the short global search of the hybrid fits (see hybrid_par_opt)
+    narrow_box - search only the window around the initial estimate (see de_fit)
+    """
+    if de_options is None:
+        de_options = {}
+    settings = dict(DE_BUDGET[model])
+    settings.update(de_options.get(model, {}))
+    settings['workers'] = int(de_options.get('workers', 1))
+    settings['seed'] = de_options.get('seed')
+    """returns dictionary of keyword arguments for et_optim.differential_evolution"""
+    return settings
+
+def set_de_budget(fit, result, settings):
+    """
+    The function implemented to store the search budget of the differential evolution fit in the fit result.
+    returns the fit result
+    """
+    fit.de_popsize = int(result.n_pop)
+    fit.de_maxiter = int(settings['maxiter'])
+    fit.generations = int(result.nit)
+    return fit
+
+"""
+Window of the narrowed search box around the initial estimate (de_fit with "narrow_box": true):
+('span', w) - estimate +/- w*max(|estimate|, absorbance range of the standards), ('factor', f) - estimate/f .. estimate*f.
+Parameters not listed keep the whole range from elisa-tool.conf.
+"""
+GUESS_WINDOW = {'LN': {'A': ('span', 1.0), 'B': ('span', 1.0)},
+                '4PL': {'D': ('span', 1.0), 'A': ('span', 1.0), 'B': ('factor', 10.0), 'C': ('factor', 20.0)},
+                '5PL': {'D': ('span', 1.0), 'A': ('span', 1.0), 'B': ('factor', 10.0), 'C': ('factor', 20.0)}}
+
+def start_estimate(D_st, model, bounds):
+    """
+    The function implemented to estimate the starting parameters of the LN, 4PL or 5PL model from the calibration
+    standards (output of data_std_format, see et_optim.initial_guess), clipped to the parameters ranges.
+    returns 1-D array with the parameters in the order of et_optim.MODELS
+    """
+    limits = np.array(bounds, dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        guess = eto.initial_guess(model, D_st[0], D_st[1])
+    guess = np.where(np.isfinite(guess), guess, (limits[:, 0] + limits[:, 1])/2)
+    return np.clip(guess, limits[:, 0], limits[:, 1])
+
+def search_box(D_st, model, bounds, estimate):
+    """
+    The function implemented to narrow the parameters ranges to the window (GUESS_WINDOW) around the initial estimate.
+    returns list of (min, max) pairs inside the original ranges
+    """
+    y_range = np.ptp(np.asarray(D_st[1], dtype='float64'))
+    box = []
+    for name, (low, high), value in zip(eto.MODELS[model][0], bounds, estimate):
+        kind, width = GUESS_WINDOW[model].get(name, (None, None))
+        if kind == 'span':
+            half = width*max(abs(value), y_range)
+            low, high = max(low, value - half), min(high, value + half)
+        elif kind == 'factor' and value > 0:
+            low, high = max(low, value/width), min(high, value*width)
+        box.append((low, high))
+    return box
+
+def warm_estimate(prior, bounds):
+    """returns median of the stored parameter sets (et_cache.FitStore.prior) clipped to the parameters ranges"""
+    limits = np.array(bounds, dtype='float64')
+    return np.clip(np.median(prior, axis=0), limits[:, 0], limits[:, 1])
+
+def prior_box(prior, bounds):
+    """
+    The function implemented to tighten the parameters ranges to the envelope of the stored parameter sets,
+    widened by half of their spread and 10% of their median.
+    returns list of (min, max) pairs inside the original ranges
+    """
+    limits = np.array(bounds, dtype='float64')
+    pad = 0.5*np.ptp(prior, axis=0) + 0.1*np.abs(np.median(prior, axis=0)) + 1e-9*(limits[:, 1] - limits[:, 0])
+    low = np.maximum(limits[:, 0], np.min(prior, axis=0) - pad)
+    high = np.minimum(limits[:, 1], np.max(prior, axis=0) + pad)
+    return list(zip(low, np.maximum(low, high)))
+
+def de_fit(model, D_st, bounds, de_options=None, prior=None):
+    """
+    The function implemented to run the differential evolution fit of the LN, 4PL or 5PL model seeded with the initial
+    estimate of the parameters (start_estimate). With "narrow_box": true in the "DE" section the search is limited to
+    the window around the estimate (search_box); if the optimum ends on an edge of the window which is not an edge
+    of the original ranges, the search is repeated on the whole ranges from that point.
+    With prior (accepted parameters of the same assay, et_cache.FitStore.prior) the search starts from their median
+    in the ranges tightened to their envelope (prior_box), with the same fallback to the whole ranges.
+    returns (scipy.optimize.OptimizeResult, settings of the search)
+    """
+    if de_options is None:
+        de_options = {}
+    rss_func = eto.MODELS[model][2]
+    X_st = np.array(D_st[0], dtype='float64')
+    Y_st = np.array(D_st[1], dtype='float64')
+    settings = de_settings(de_options, model)
+    if prior is not None:
+        guess = warm_estimate(prior, bounds)
+        box = prior_box(prior, bounds)
+    else:
+        guess = start_estimate(D_st, model, bounds)
+        if not de_options.get('narrow_box', False):
+            return eto.differential_evolution(rss_func, bounds, args=(X_st, Y_st), x0=guess, **settings), settings
+        box = search_box(D_st, model, bounds, guess)
+    result = eto.differential_evolution(rss_func, box, args=(X_st, Y_st), x0=guess, **settings)
+    limits = np.array(bounds, dtype='float64')
+    window = np.array(box, dtype='float64')
+    on_edge = (((result.x <= window[:, 0]) & (window[:, 0] > limits[:, 0])) |
+               ((result.x >= window[:, 1]) & (window[:, 1] < limits[:, 1])))
+    if np.any(on_edge):
+        """the window was too narrow, the whole ranges are searched from the best point"""
+        full = eto.differential_evolution(rss_func, bounds, args=(X_st, Y_st), x0=result.x, **settings)
+        full.nit += result.nit
+        full.nfev += result.nfev
+        result = full
+    return result, settings
+
+def fit_start(D_st, model, bounds, prior=None):
+    """returns start point of the local fits: median of the stored parameter sets (prior) or start_estimate"""
+    if prior is not None:
+        return warm_estimate(prior, bounds)
+    return start_estimate(D_st, model, bounds)
+
+def at_range_limit(par, bounds, rtol=1e-6):
+    """
+    The function implemented to check if the fitted parameters are at the limits of their ranges. The bounded local
+    optimizers (curve_fit and least_squares with the trust-region method) stay strictly inside the ranges, so a parameter
+    closer than rtol*(range width) to the range limit is at the limit.
+    Function input:
+    par - 1-D array of the parameters (or K x n_par array of K fits)
+    bounds - list of (min, max) pairs of the parameters ranges
+    returns True if at least one of the parameters is at the range limit (boolean array K for K fits)
+    """
+    limits = np.array(bounds, dtype='float64')
+    margin = rtol*(limits[:, 1] - limits[:, 0])
+    par = np.asarray(par, dtype='float64')
+    return np.any(par <= limits[:, 0] + margin, axis=-1) | np.any(par >= limits[:, 1] - margin, axis=-1)
+
 #ln function stuff
-def ln_func_par_opt(D_st, start_range):
+def ln_func_par_opt(D_st, start_range, de_options=None, prior=None):
     """
-    The function implemented to calculate an optimal ln function parameters. The logarithmic function is given below. Returns list of tuples with theparameters.
+    The function implemented to calculate an optimal ln function parameters. The logarithmic function is given below. Returns FitResult with the parameters.
     Uses tuple of two 1-D lists of calibration standards data of the same size as an input data.
     """
-    X_st1 = np.array(D_st[0])
-    Y_st1 = np.array(D_st[1])
-    
-    def ln_func_opt(X_param):
-        Y_th1=X_param[0]*np.log(X_st1)+X_param[1]
-        MNK=sum((Y_th1-Y_st1)**2)
-        return(MNK)
+    X_st1 = np.array(D_st[0], dtype='float64')
+    Y_st1 = np.array(D_st[1], dtype='float64')
     
     A_l = start_range['A'][0]
     A_p = start_range['A'][1]
@@ -139,32 +313,18 @@ def ln_func_par_opt(D_st, start_range):
     B_p = start_range['B'][1]
     bounds=[(A_l, A_p),(B_l, B_p)]
 
-    result = differential_evolution(ln_func_opt, bounds, maxiter=750000, popsize= 45, strategy='best2bin')    
+    result, settings = de_fit('LN', D_st, bounds, de_options, prior)
    
-    par=[result.x[0], result.x[1]]
-    RSS=ln_func_opt(X_param=par)/len(X_st1)
-    if(result.x[0] == A_l or result.x[0] == A_p or result.x[1] == B_l or result.x[1] == B_p or RSS > 0.3):
+    RSS=result.fun/len(X_st1)
+    if(at_range_limit(result.x, bounds) or RSS > 0.3):
         """ at least one of the parameters is equal to the range limit, error!"""
         error_bound = 1
     else:
         """ the parameters in proper range, ok"""
         error_bound = 0
       
-    parameters=[('A_par1',result.x[0]), ('B_par1',result.x[1]), ('RSS', RSS)]
-
-    R_squ=R_squared_LN(D_st, parameters)
-    if(R_squ < 0.6):  error_bound = 1
-    y_theor = LN_func(X_data=X_st1, param=parameters)
-    akaike_crit = aic.aic(y=Y_st1, y_pred=y_theor, p=2)
-    bayes_crit = bic.bic(y=Y_st1, y_pred=y_theor, p=2)
-    r, prob = pearsonr(Y_st1, y_theor)
-
-    parameters.append(('R_squ', R_squ))
-    parameters.append(('AIC_crit', akaike_crit))
-    parameters.append(('BIC_crit', bayes_crit))
-    parameters.append(('R_corre', r))    
-    parameters.append(('Error', error_bound))
-
+    parameters = set_de_budget(fit_quality(D_st, result.x, 'LN', RSS, error_bound), result, settings)
+    """returns FitResult with optimal ln-model parameters"""
     return(parameters)
 
 
@@ -210,25 +370,20 @@ def R_squared_LN(D_st, par):
     Function input:
     D_st - a tuple of calibration standard values list (D_st[0]- titer concentration, D_st[1] - absorbance)
     """
-    X_dat=D_st[0]
+    X_dat=np.array(D_st[0], dtype='float64')
     Ytheoretical=LN_func(X_data= X_dat, param=par)
-    resp=r2_score(y_true= D_st[1], y_pred= Ytheoretical)
+    resp=eto.fit_metrics(D_st[1], Ytheoretical, 1)[1]
     """returns R^2 value for the fitted model and previously chosen data set"""
     return resp
     
 #logit 5PL function stuff
-def logit_5PL_par_opt(D_st, start_range):
+def logit_5PL_par_opt(D_st, start_range, de_options=None, prior=None):
     """
-    The function implemented to calculate an optimal 5PL function parameters. The 5PL function is given below. Returns list of tuples with the parameters.
+    The function implemented to calculate an optimal 5PL function parameters. The 5PL function is given below. Returns FitResult with the parameters.
     Uses tuple or a list of two 1-D lists of calibration standards data of the same size as an input data.
     """
-    X_st = np.array(D_st[0])
-    Y_st = np.array(D_st[1])
-    
-    def logit_func_opt(X_param):
-        Y_th = X_param[0] + ((X_param[1] - X_param[0])/(1 + (X_st/X_param[3])**X_param[2])**X_param[4])
-        MNK = sum((Y_th-Y_st)**2)
-        return MNK 
+    X_st = np.array(D_st[0], dtype='float64')
+    Y_st = np.array(D_st[1], dtype='float64')
    
     D_l = start_range['D'][0]
     D_p = start_range['D'][1]
@@ -243,35 +398,18 @@ def logit_5PL_par_opt(D_st, start_range):
     bounds=[(D_l, D_p),(A_l, A_p),(B_l, B_p),(C_l, C_p),(E_l, E_p)]
 
        
-    result = differential_evolution(logit_func_opt, bounds, maxiter=750000, popsize= 45, strategy='best2bin')
+    result, settings = de_fit('5PL', D_st, bounds, de_options, prior)
 
-    par=[result.x[0], result.x[1], result.x[2], result.x[3], result.x[4]]  
-    RSS=logit_func_opt(X_param=par)/len(X_st)
-    if(result.x[1] == A_l or result.x[1] == A_p or result.x[2] == B_l or result.x[2] == B_p or
-       result.x[3] == C_l or result.x[3] == C_p or result.x[0] == D_l or result.x[0] == D_p or
-       result.x[4] == E_l or result.x[4] == E_p or RSS > 0.3):
+    RSS=result.fun/len(X_st)
+    if(at_range_limit(result.x, bounds) or RSS > 0.3):
         """ at least one of the parameters is equal to the range limit, error!"""
         error_bound = 1
     else:
         """ the parameters in proper range, ok"""
         error_bound = 0
     
-    parameters=[('D_par1',result.x[0]), ('A_par1',result.x[1]), ('B_par1', result.x[2]), ('C_par1', result.x[3]), 
-                ('E_par1', result.x[4]), ('RSS', RSS)]
-
-    R_squ=R_squared_5PL(D_st, parameters)
-    if(R_squ < 0.6):  error_bound = 1   
-    y_theor = logit_5PL_func(X_data=X_st, param=parameters)
-    akaike_crit = aic.aic(y=Y_st, y_pred=y_theor, p=5)
-    bayes_crit = bic.bic(y=Y_st, y_pred=y_theor, p=5)
-    r, prob = pearsonr(Y_st, y_theor)
-
-    parameters.append(('R_squ', R_squ))
-    parameters.append(('AIC_crit', akaike_crit))
-    parameters.append(('BIC_crit', bayes_crit))
-    parameters.append(('R_corre', r))
-    parameters.append(('Error', error_bound))   
-    """returns the list of tuples with 5PL model parameters"""
+    parameters = set_de_budget(fit_quality(D_st, result.x, '5PL', RSS, error_bound), result, settings)
+    """returns FitResult with 5PL model parameters"""
     return (parameters)
 
 
@@ -319,27 +457,22 @@ def R_squared_5PL(D_st, par):
     Function input:
     D_st - a tuple of calibration standard values list (D_st[0]- titer concentration, D_st[1] - absorbance)
     """
-    X_dat=D_st[0]
+    X_dat=np.array(D_st[0], dtype='float64')
     Ytheoretical=logit_5PL_func(X_data= X_dat, param=par)
-    resp=r2_score(y_true= D_st[1], y_pred= Ytheoretical)
+    resp=eto.fit_metrics(D_st[1], Ytheoretical, 1)[1]
     """returns R^2 value for the fitted model and previously chosen data set"""
     return(resp)
     
 
 #logit 4PL function stuff
-def logit_4PL_par_opt(D_st, start_range):
+def logit_4PL_par_opt(D_st, start_range, de_options=None, prior=None):
     """
-    The function implemented to calculate an optimal 4PL function parameters. The 5PL function is given below. Returns a list of tuples with the 4PL model parameters.
+    The function implemented to calculate an optimal 4PL function parameters. The 5PL function is given below. Returns FitResult with the 4PL model parameters.
     Function input:
     Uses tuple or a list of two 1-D lists of calibration standards data of the same size as an input data.
     """
-    X_st = D_st[0]
-    Y_st = D_st[1]
-    
-    def logit_func_opt(X_param):
-        Y_th = X_param[0] + (X_param[1] - X_param[0])/(1 + (X_st/X_param[3])**X_param[2])
-        MNK = sum((Y_th-Y_st)**2)
-        return MNK
+    X_st = np.array(D_st[0], dtype='float64')
+    Y_st = np.array(D_st[1], dtype='float64')
 
     D_l = start_range['D'][0]
     D_p = start_range['D'][1]
@@ -351,34 +484,18 @@ def logit_4PL_par_opt(D_st, start_range):
     C_p = start_range['C'][1]
 
     bounds=[(D_l, D_p),(A_l, A_p),(B_l, B_p),(C_l, C_p)]
-    result = differential_evolution(logit_func_opt, bounds, maxiter=750000, popsize= 45, strategy='best2bin')
+    result, settings = de_fit('4PL', D_st, bounds, de_options, prior)
 
-    par=[result.x[0], result.x[1], result.x[2], result.x[3]]
-    RSS=logit_func_opt(X_param=par)/len(X_st)  
-    if(result.x[1] == A_l or result.x[1] == A_p or result.x[2] == B_l or result.x[2] == B_p or
-       result.x[3] == C_l or result.x[3] == C_p or result.x[0] == D_l or result.x[0] == D_p or RSS > 0.3):
+    RSS=result.fun/len(X_st)  
+    if(at_range_limit(result.x, bounds) or RSS > 0.3):
         """ at least one of the parameters is equal to the range limit, error!"""
         error_bound = 1
     else:
         """ the parameters in proper range, ok"""
         error_bound = 0
     
-    parameters=[('D_par1',result.x[0]), ('A_par1',result.x[1]), ('B_par1', result.x[2]), 
-                ('C_par1', result.x[3]), ('RSS', RSS)]
-
-    R_squ=R_squared_4PL(D_st, parameters)
-    if(R_squ < 0.6):  error_bound = 1
-    y_theor = logit_4PL_func(X_data=X_st, param=parameters)
-    akaike_crit = aic.aic(y=Y_st, y_pred=y_theor, p=4)
-    bayes_crit = bic.bic(y=Y_st, y_pred=y_theor, p=4)
-    r, prob = pearsonr(Y_st, y_theor)
-
-    parameters.append(('R_squ', R_squ))
-    parameters.append(('AIC_crit', akaike_crit))
-    parameters.append(('BIC_crit', bayes_crit))
-    parameters.append(('R_corre', r))
-    parameters.append(('Error', error_bound))
-    """returns list of tuples with optimal 4PL-model parameters and R_squ"""
+    parameters = set_de_budget(fit_quality(D_st, result.x, '4PL', RSS, error_bound), result, settings)
+    """returns FitResult with optimal 4PL-model parameters and R_squ"""
     return (parameters)
 
 
@@ -424,148 +541,119 @@ def R_squared_4PL(D_st, par):
     Function input:
     D_st - a tuple of calibration standard values list (D_st[0]- titer concentration, D_st[1] - absorbance)
     """
-    X_dat = D_st[0]
+    X_dat = np.array(D_st[0], dtype='float64')
     Ytheoretical = logit_4PL_func(X_data= X_dat, param=par)
-    resp = r2_score(y_true= D_st[1], y_pred= Ytheoretical)
+    resp = eto.fit_metrics(D_st[1], Ytheoretical, 1)[1]
     """returns R^2 value for the fitted model and previously chosen data set"""
     return(resp)
 
-def data_std_format(imp_data, imp_data_map, data_standards):
+def data_std_format(imp_data, imp_data_map, data_standards, plate=None):
     """
     The function implemented to extract, clean and order calibration standards for further ln-model fitting.
     """
-    g1=imp_data_map.stack()
-    g2=set(g1)
-    for g in g2:
-        vars()[g]=[]
-        
-    imp_columns=list(imp_data.columns.values)
-    imp_index=list(imp_data.index.values)
-    
-    for c_name in imp_columns:
-        for r_name in imp_index:
-            vars()[imp_data_map.loc[r_name][c_name]].append(imp_data.loc[r_name][c_name])
-            
-    X_st = []
-    Y_st = []
-    
-    for g in g2:
-        vars()[g]=sum(vars()[g]) / float(len(vars()[g]))
-        if ('std' in g):
-            X_st.append(data_standards.loc[g]['values'])
-            Y_st.append(vars()[g])
-            continue
-        else:
-            continue
+    ave_abs = replicate_means(imp_data=imp_data, imp_data_map=imp_data_map, plate=plate)
+    std_names = [g for g in ave_abs.index if 'std' in g]
+    X_st = [data_standards.loc[g]['values'] for g in std_names]
+    Y_st = ave_abs[std_names].tolist()
     """ 
     Remove zero value from concentration - unphysical and denger for logharitm
     """        
-    X_st1=copy.deepcopy(X_st)
-    Y_st1=copy.deepcopy(Y_st)
-    N=0
-    lenX=len(X_st1)
-    N_of_del=0
-    while N< lenX:
-        if X_st1[N-N_of_del]==0:
-            del(X_st1[N-N_of_del])
-            del(Y_st1[N-N_of_del])
-            N_of_del=N_of_del+1
-            N=N+1
-            continue
-        else:
-            N=N+1
-            continue
+    X_st1 = [x for x in X_st if x != 0]
+    Y_st1 = [y for x, y in zip(X_st, Y_st) if x != 0]
     """returns the tuple of two arrays"""    
     return(X_st1, Y_st1)
 
     
-def samples_concenration(imp_data, imp_data_map, params, ordered, d_st):
-    
-    def func_concentration(Y, param):
-        """ Fill std concentration by input data, but what for NC an PC?"""
-        return 0
-    
-    """Refactoring parsing_sam_and_concenration """
-    df_local = pd.DataFrame(columns=['Y_names', 'Y_abs', 'samples_nb', 'Y_ave_abs', 'Y_abs_std', 'X_concentration',\
-                                     'X_s_conc_std_bottom', 'X_s_conc_std_upper', 'Errors'])
-    df_local.set_index('Y_names', inplace=True)  # setup Y_s_names as index of DF
-    for i in range(0, len(imp_data_map.index)):
-        for j in range(0, len(imp_data_map.columns)):
-            is_string = imp_data_map.values[i,j]
-            is_concen = imp_data.values[i,j]
-            if(df_local.index.isin([is_string]).any()):
-                """If YES then add to this position"""
-                tmp_help = df_local.Y_abs[is_string]
-                tmp_help.append(is_concen) #? dlaczego tak?
-                df_local.ix[is_string, 'samples_nb'] +=  1
-            else:
-                """If NO then append to DataFrame new record"""
-                tmp_df = pd.DataFrame([[[is_concen], 1]], columns=[ 'Y_abs', 'samples_nb'], index=[is_string])
-                df_local = df_local.append(tmp_df, ignore_index=False)
+def model_family(order):
+    """
+    returns the model family (LN, 4PL or 5PL) of the order, e.g. cf4PL (curve_fit) and h4PL (hybrid) are 4PL models
+    """
+    for prefix in ('cf', 'h'):
+        if order.startswith(prefix):
+            return order[len(prefix):]
+    return order
 
+def concentration_func(ordered):
+    """
+    returns the reverse model function (absorbance -> titer concentration) of the model order or None for unknown order
+    """
+    if (model_family(ordered)=="LN"):
+        return ln_func_concentration
+    if (model_family(ordered)=="4PL"):
+        return logit_4PL_concentration
+    if (model_family(ordered)=="5PL"):
+        return logit_5PL_concentration
+    return None
+
+"""
+Confidence level of the delta-method intervals of the sample concentrations (samples_concenration)
+"""
+CI_LEVEL = 0.95
+
+def concentration_ci(fit, X, Y_dev, counts, level=CI_LEVEL):
+    """
+    The function implemented to calculate the delta-method confidence intervals of the back-calculated concentrations X
+    of all of the samples at once (et_optim.concentration_se): the covariance of the fitted parameters is combined with
+    the variance of the mean absorbance of the replicates (Y_dev - std with ddof=0 of the counts replicates).
+    The interval is symmetric in ln(x), x*exp(-/+ z*se/x), so the bounds of the titer stay positive.
+    Function input:
+    fit - FitResult of the calibration curve (NaN intervals if its covariance is unknown)
+    level - confidence level of the intervals
+    returns (lower, upper) arrays of the concentration bounds
+    """
+    from scipy.stats import norm
+    X = np.asarray(X, dtype='float64')
+    if fit.covariance is None:
+        return np.full(len(X), np.nan), np.full(len(X), np.nan)
+    Y_var = np.asarray(Y_dev, dtype='float64')**2/np.maximum(np.asarray(counts, dtype='float64') - 1, 1)
+    se = eto.concentration_se(fit.model, fit.params, fit.covariance, X, Y_var)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        spread = np.exp(norm.ppf(0.5 + level/2.0)*se/X)
+    return X/spread, X*spread
+
+def samples_concenration(imp_data, imp_data_map, params, ordered, d_st, plate=None):
+    """
+    The function implemented to calculate titer concentration of all of the samples of the plate.
+    Replicates are aggregated with et_plate.Plate.replicate_stats and the concentrations (with the +/- std bounds
+    and the CI_LEVEL confidence intervals of concentration_ci) are back-calculated for all of the samples at once.
+    """
+    plate = plate_of(imp_data, imp_data_map, plate)
     """
     First time for std, to prepare value for LN limit condition
     """
-    for index, row in df_local.iterrows():
-        row["Y_ave_abs"] = sum(row["Y_abs"])/row["samples_nb"]
-        row["Y_abs_std"] = np.std(row["Y_abs"])
-        if ('std' in index):  # put standard concentration (comming from parsing part) to the main DF
-            row["X_concentration"] = d_st.conc[index]
-            row["Errors"] = 100
+    df_local = replicate_table(plate=plate, d_st=d_st)
+    Y_ave = df_local['Y_ave_abs'].values
+    Y_dev = df_local['Y_abs_std'].values
     
-    Max_ind_of_std = df_local['Y_ave_abs'].astype('float64').idxmax(skipna=True)  
-    Max_val_of_std = df_local.loc[Max_ind_of_std]['Y_ave_abs']
-    Max_val_of_dev = df_local.loc[Max_ind_of_std]['Y_abs_std']
+    Max_ind_of_std = np.nanargmax(Y_ave)
+    Max_val_of_std = Y_ave[Max_ind_of_std]
+    Max_val_of_dev = Y_dev[Max_ind_of_std]
     """
     Second time for sam only
-    """       
-    for index, row in df_local.iterrows():
-        if ('sam' in index):           
-            if ((ordered=="LN") or (ordered=="cfLN")):
-                if(((row["Y_ave_abs"] + row["Y_abs_std"]) >= 0.0) and (row["Y_ave_abs"] - row["Y_abs_std"]) <= (Max_val_of_dev + Max_val_of_std)):
-                    ave_concentr = ln_func_concentration(Y_data=row["Y_ave_abs"], param=params)
-                    row["X_concentration"] = ave_concentr
-                    row["X_s_conc_std_upper"] = ln_func_concentration(Y_data=(row["Y_ave_abs"] + row["Y_abs_std"]), param=params) - ave_concentr
-                    row["X_s_conc_std_bottom"] = ave_concentr - ln_func_concentration(Y_data=(row["Y_ave_abs"] - row["Y_abs_std"]), param=params)
-                    row["Errors"] = 0
-                else:
-                    row["X_concentration"] = 0.0
-                    row["Errors"] = 1
-            if ((ordered=="4PL") or (ordered=="cf4PL")): 
-                if((row["Y_ave_abs"]  + row["Y_abs_std"] >= params[1][1]) and (row["Y_ave_abs"] - row["Y_abs_std"] <= params[0][1])):
-                    """ 1) bottom limit for 4PL (Y_abs+Y_std >= A_par)
-                        2) upper limit for 4PL (Y_abs-Y_std <= D_par)
-                    """
-                    ave_concentr = logit_4PL_concentration(Y_data=row["Y_ave_abs"], param=params)
-                    row["X_concentration"] = ave_concentr
-                    row["X_s_conc_std_upper"] = logit_4PL_concentration(Y_data=(row["Y_ave_abs"] + row["Y_abs_std"]), param=params) - ave_concentr
-                    row["X_s_conc_std_bottom"] = ave_concentr - logit_4PL_concentration(Y_data=(row["Y_ave_abs"] - row["Y_abs_std"]), param=params)
-                    row["Errors"] = 0
-                else:
-                    row["X_concentration"] = 0.0
-                    row["Errors"] = 1
-            if ((ordered=="5PL") or (ordered=="cf5PL")):            
-                if((row["Y_ave_abs"] + row["Y_abs_std"] >= params[1][1]) and (row["Y_ave_abs"] - row["Y_abs_std"] <= params[0][1])): 
-                    """ 1) bottom limit for 5PL (Y_abs+Y_std >= A_par)
-                        2) upper limit for 5PL (Y_abs-Y_std <= D_par)
-                    """
-                    ave_concentr = logit_5PL_concentration(Y_data=row["Y_ave_abs"], param=params)
-                    row["X_concentration"] = ave_concentr
-                    row["X_s_conc_std_upper"] = logit_5PL_concentration(Y_data=(row["Y_ave_abs"] + row["Y_abs_std"]), param=params) - ave_concentr
-                    row["X_s_conc_std_bottom"] = ave_concentr - logit_5PL_concentration(Y_data=(row["Y_ave_abs"] - row["Y_abs_std"]), param=params)
-                    row["Errors"] = 0
-                else:
-                    row["X_concentration"] = 0.0
-                    row["Errors"] = 1
-               
-        """                    
-        if ('zero' in index): 
-            df_local["X_concentration"] = func_concentration(Y=df_local['Y_ave_abs'], param=params)
-        if ('nc' in index):  
-            df_local["X_concentration"] = func_concentration(Y=df_local['Y_ave_abs'], param=params)
-        if ('pc' in index):
-            df_local["X_concentration"] = func_concentration(Y=df_local['Y_ave_abs'], param=params)
-        """   
+    """
+    is_sam = np.array([('sam' in g) for g in df_local.index], dtype=bool)
+    reverse_func = concentration_func(ordered)
+    if reverse_func is not None:
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            if (model_family(ordered)=="LN"):
+                in_range = ((Y_ave + Y_dev) >= 0.0) & ((Y_ave - Y_dev) <= (Max_val_of_dev + Max_val_of_std))
+            else:
+                """ 1) bottom limit for 4PL/5PL (Y_abs+Y_std >= A_par)
+                    2) upper limit for 4PL/5PL (Y_abs-Y_std <= D_par)
+                """
+                in_range = ((Y_ave + Y_dev) >= params[1][1]) & ((Y_ave - Y_dev) <= params[0][1])
+            good = is_sam & in_range
+            ave_concentr = reverse_func(Y_data=Y_ave[good], param=params)
+            df_local.loc[good, 'X_concentration'] = ave_concentr
+            df_local.loc[good, 'X_s_conc_std_upper'] = reverse_func(Y_data=(Y_ave[good] + Y_dev[good]), param=params) - ave_concentr
+            df_local.loc[good, 'X_s_conc_std_bottom'] = ave_concentr - reverse_func(Y_data=(Y_ave[good] - Y_dev[good]), param=params)
+            ci_bottom, ci_upper = concentration_ci(FitResult.of(params, model_family(ordered)), ave_concentr,
+                                                   Y_dev[good], df_local['samples_nb'].values[good])
+            df_local.loc[good, 'X_s_conc_ci_bottom'] = ci_bottom
+            df_local.loc[good, 'X_s_conc_ci_upper'] = ci_upper
+            df_local.loc[good, 'Errors'] = 0
+            df_local.loc[is_sam & ~in_range, 'X_concentration'] = 0.0
+            df_local.loc[is_sam & ~in_range, 'Errors'] = 1
     """returns sample names, titer concentration, lower and upper boundaries of concentration standard deviations and simmetrical value of absorbance standard deviation."""
 
     print(df_local)
@@ -580,35 +668,20 @@ def samples_concenration(imp_data, imp_data_map, params, ordered, d_st):
        Y_s_abs_std         - simmetrical value of absorbance standard deviation
        X_std_abs           - concentrations of standards 
        Y_std_abs           - ave. absorption of standards 
-       Y_std_std           - std of absorption of standards.
+       Y_std_std           - std of absorption of standards,
+       X_s_conc_ci_bottom  - lower bounds of the CI_LEVEL confidence intervals of the concentration,
+       X_s_conc_ci_upper   - upper bounds of the CI_LEVEL confidence intervals of the concentration.
     """
-    Y_s_names = []
-    X_s_concentration = []
-    Y_s_good = []
-    Y_s_bad = []
-    Y_s_abs_std = []
-    X_s_conc_std_bottom = []
-    X_s_conc_std_upper = []
-    Y_std_std = []
-    Y_std_abs = []
-    X_std_abs = []
-    for index, row in df_local.iterrows():
-        if (('sam' in index) and (row['Errors']==0)):
-            Y_s_names.append(index)
-            X_s_concentration.append(row["X_concentration"])
-            Y_s_good.append(row["Y_ave_abs"])
-            Y_s_abs_std.append(row["Y_abs_std"])
-            X_s_conc_std_upper.append(row["X_s_conc_std_upper"])
-            X_s_conc_std_bottom.append(row["X_s_conc_std_bottom"])
-        if (('sam' in index) and (row['Errors']==1)): # develop for more error levels
-            Y_s_bad.append(index)
-        if (('std' in index) and (row['Errors']==100)):
-            Y_std_std.append(row["Y_abs_std"])
-            Y_std_abs.append(row["Y_ave_abs"])
-            X_std_abs.append(row["X_concentration"])
-          
-    #          0              1               2        3          4                   5                  6             7          8          9
-    return (Y_s_names, X_s_concentration, Y_s_good, Y_s_bad, X_s_conc_std_bottom, X_s_conc_std_upper, Y_s_abs_std, X_std_abs, Y_std_abs, Y_std_std)
+    is_std = np.array([('std' in g) for g in df_local.index], dtype=bool)
+    Errors = df_local['Errors'].values
+    sam_good = df_local[is_sam & (Errors == 0)]
+    sam_bad = df_local[is_sam & (Errors == 1)] # develop for more error levels
+    std_rows = df_local[is_std & (Errors == 100)]
+    #          0              1               2        3          4                   5                  6             7          8          9          10         11
+    return (list(sam_good.index), sam_good['X_concentration'].tolist(), sam_good['Y_ave_abs'].tolist(), list(sam_bad.index),
+            sam_good['X_s_conc_std_bottom'].tolist(), sam_good['X_s_conc_std_upper'].tolist(), sam_good['Y_abs_std'].tolist(),
+            std_rows['X_concentration'].tolist(), std_rows['Y_ave_abs'].tolist(), std_rows['Y_abs_std'].tolist(),
+            sam_good['X_s_conc_ci_bottom'].tolist(), sam_good['X_s_conc_ci_upper'].tolist())
 
         
 def samples_concenration_new(imp_data, imp_data_map, params, ordered, d_st, df_local):
@@ -620,7 +693,7 @@ def samples_concenration_new(imp_data, imp_data_map, params, ordered, d_st, df_l
     """Refactoring parsing_sam_and_concenration """
     for index, row in df_local.iterrows():
         if ('sam' in index):           
-            if ((ordered=="LN") or (ordered=="cfLN")):
+            if (model_family(ordered)=="LN"):
                 if(row["Y_ave_abs"] >= params[1][1]): #temporary solution
                     ave_concentr = ln_func_concentration(Y_data=row["Y_ave_abs"], param=params)
                     row["X_concentration"] = ave_concentr
@@ -630,7 +703,7 @@ def samples_concenration_new(imp_data, imp_data_map, params, ordered, d_st, df_l
                 else:
                     row["X_concentration"] = 0.0
                     row["Errors"] = 1
-            if ((ordered=="4PL") or (ordered=="cf4PL")): 
+            if (model_family(ordered)=="4PL"): 
                 if((row["Y_ave_abs"]  + row["Y_abs_std"] >= params[1][1]) and (row["Y_ave_abs"] - row["Y_abs_std"] <= params[0][1])):
                     """ 1) bottom limit for 4PL (Y_abs+Y_std >= A_par)
                         2) upper limit for 4PL (Y_abs-Y_std <= D_par)
@@ -643,7 +716,7 @@ def samples_concenration_new(imp_data, imp_data_map, params, ordered, d_st, df_l
                 else:
                     row["X_concentration"] = 0.0
                     row["Errors"] = 1
-            if ((ordered=="5PL") or (ordered=="cf5PL")):            
+            if (model_family(ordered)=="5PL"):            
                 if((row["Y_ave_abs"] + row["Y_abs_std"] >= params[1][1]) and (row["Y_ave_abs"] - row["Y_abs_std"] <= params[0][1])): 
                     """ 1) bottom limit for 5PL (Y_abs+Y_std >= A_par)
                         2) upper limit for 5PL (Y_abs-Y_std <= D_par)
@@ -711,37 +784,17 @@ def samples_concenration_new(imp_data, imp_data_map, params, ordered, d_st, df_l
 #    return df_local
         
  
-def recognition_experiment(imp_data, imp_data_map, d_st):
+def recognition_experiment(imp_data, imp_data_map, d_st, plate=None):
     
     def func_concentration(Y, param):
         """ Fill std concentration by input data, but what for NC an PC?"""
         return 0
     
     """Refactoring parsing_sam_and_concenration """
-    df_local = pd.DataFrame(columns=['Y_names', 'Y_abs', 'samples_nb', 'Y_ave_abs', 'Y_abs_std', 'X_concentration',\
-                                     'X_s_conc_std_bottom', 'X_s_conc_std_upper', 'Errors'])
-    df_local.set_index('Y_names', inplace=True)  # setup Y_s_names as index of DF
-    for i in range(0, len(imp_data_map.index)):
-        for j in range(0, len(imp_data_map.columns)):
-            is_string = imp_data_map.values[i,j]
-            is_concen = imp_data.values[i,j]
-            if(df_local.index.isin([is_string]).any()):
-                """If YES then add to this position"""
-                tmp_help = df_local.Y_abs[is_string]
-                tmp_help.append(is_concen) #? dlaczego tak?
-                df_local.ix[is_string, 'samples_nb'] +=  1
-            else:
-                """If NO then append to DataFrame new record"""
-                tmp_df = pd.DataFrame([[[is_concen], 1]], columns=[ 'Y_abs', 'samples_nb'], index=[is_string])
-                df_local = df_local.append(tmp_df, ignore_index=False)
+    plate = plate_of(imp_data, imp_data_map, plate)
+    df_local = replicate_table(plate=plate, d_st=d_st)
     flag = 'STD'
-    for index, row in df_local.iterrows():
-        row["Y_ave_abs"] = sum(row["Y_abs"])/row["samples_nb"]
-        row["Y_abs_std"] = np.std(row["Y_abs"])
-        #if ('sam' in index):                       
-        if ('std' in index):  # put standard concentration (comming from parsing part) to the main DF
-            row["X_concentration"] = d_st.conc[index]
-            row["Errors"] = 100
+    for index in df_local.index:
         if (('nc' in index) and ('pc' in index)):  
             flag = 'SPC'
                
@@ -800,64 +853,52 @@ def recognition_experiment(imp_data, imp_data_map, d_st):
     return df_local, flag
 
        
-def LN_func_curve_fit(D_st, start_range):
+def LN_func_curve_fit(D_st, start_range, prior=None):
     """
     Optimization on the base of curvr_fit function
     """
+    from scipy.optimize import curve_fit
     X_st = D_st[0]
     Y_st = D_st[1]
     
-    def logit_func_LN(X_st, A, B):
-        Y_th = A*np.log(X_st) + B
-        return Y_th
+    logit_func_LN, jac_LN = eto.curve_fit_model('LN')
   
     A_l = start_range['A'][0]
     A_p = start_range['A'][1]
     B_l = start_range['B'][0]
     B_p = start_range['B'][1]
     
-    par, pcov = curve_fit(logit_func_LN, X_st, Y_st, bounds=([A_l, B_l],[A_p, B_p]))
+    bounds = [(A_l, A_p), (B_l, B_p)]
+    p0 = fit_start(D_st, 'LN', bounds, prior)
+    par, pcov = curve_fit(logit_func_LN, X_st, Y_st, bounds=([A_l, B_l],[A_p, B_p]), jac=jac_LN, p0=p0)
 
     def avarage_LN(X_st, par):
-        Y_new=logit_func_LN(X_st=X_st, A=par[0], B=par[1])
+        Y_new=logit_func_LN(X_st, *par)
         return  sum((Y_new-Y_st)**2)
     
     RSS=avarage_LN(X_st, par)/len(X_st)
-    if(par[0] == A_l or par[0] == A_p or par[1] == B_l or par[1] == B_p or RSS > 0.3):
+    if(at_range_limit(par, bounds) or RSS > 0.3):
         """ at least one of the parameters is equal to the range limit, error!"""
         error_bound = 1
     else:
         """ the parameters in proper range, ok"""
         error_bound = 0
     
-    parameters=[('A_par1',par[0]), ('B_par1', par[1]), ('RSS', RSS)]
-    
-    R_squ=R_squared_LN(D_st, parameters)
-    if(R_squ < 0.6):  error_bound = 1
-    y_theor = LN_func(X_data=X_st, param=parameters)
-    akaike_crit = aic.aic(y=Y_st, y_pred=y_theor, p=2)
-    bayes_crit = bic.bic(y=Y_st, y_pred=y_theor, p=2)
-    r, prob = pearsonr(Y_st, y_theor)
-
-    parameters.append(('R_squ', R_squ))
-    parameters.append(('AIC_crit', akaike_crit))
-    parameters.append(('BIC_crit', bayes_crit))
-    parameters.append(('R_corre', r))  
-    parameters.append(('Error', error_bound))
-    """returns list of tuples with optimal 4PL-model parameters and R_squ"""
+    parameters = fit_quality(D_st, par, 'LN', RSS, error_bound, covariance=pcov)
+    """returns FitResult with optimal ln-model parameters, R_squ and covariance of the parameters"""
     return (parameters)
 
 
-def logit_4PL_curve_fit(D_st, start_range):
+def logit_4PL_curve_fit(D_st, start_range, prior=None):
     """
     Optimization on the base of curvr_fit function
     """
+    from scipy.optimize import curve_fit
     X_st = D_st[0]
     Y_st = D_st[1]
     
-    def logit_func_4PL(X_st, A, B, C, D):
-        Y_th = D + (A - D)/(1 + (X_st/C)**B)        
-        return Y_th
+    """the parameters in the order of the bounds: [D, A, B, C]"""
+    logit_func_4PL, jac_4PL = eto.curve_fit_model('4PL')
   
     D_l = start_range['D'][0]
     D_p = start_range['D'][1]
@@ -868,48 +909,35 @@ def logit_4PL_curve_fit(D_st, start_range):
     C_l = start_range['C'][0]
     C_p = start_range['C'][1]
     
-    par, pcov = curve_fit(logit_func_4PL, X_st, Y_st, bounds=([D_l, A_l, B_l, C_l], [D_p, A_p, B_p, C_p]))
+    bounds = [(D_l, D_p), (A_l, A_p), (B_l, B_p), (C_l, C_p)]
+    p0 = fit_start(D_st, '4PL', bounds, prior)
+    par, pcov = curve_fit(logit_func_4PL, X_st, Y_st, bounds=([D_l, A_l, B_l, C_l], [D_p, A_p, B_p, C_p]), jac=jac_4PL, p0=p0)
 
     def avarage_4PL(X_st, par):
-        Y_new=logit_func_4PL(X_st=X_st, A=par[1], B=par[2], C=par[3], D=par[0])
+        Y_new=logit_func_4PL(X_st, *par)
         return  sum((Y_new-Y_st)**2)
     
     RSS=avarage_4PL(X_st, par)/len(X_st)
-    if(par[1] == A_l or par[1] == A_p or par[2] == B_l or par[2] == B_p or
-       par[3] == C_l or par[3] == C_p or par[0] == D_l or par[0] == D_p or RSS > 0.3):
+    if(at_range_limit(par, bounds) or RSS > 0.3):
         """ at least one of the parameters is equal to the range limit, error!"""
         error_bound = 1
     else:
         """ the parameters in proper range, ok"""
         error_bound = 0
     
-    parameters=[('D_par1',par[0]), ('A_par1',par[1]), ('B_par1', par[2]), 
-                ('C_par1', par[3]), ('RSS', RSS)]
-
-    R_squ = R_squared_4PL(D_st, parameters)
-    if(R_squ < 0.6):  error_bound = 1
-    y_theor = logit_4PL_func(X_data=X_st, param=parameters)
-    akaike_crit = aic.aic(y=Y_st, y_pred=y_theor, p=4)
-    bayes_crit = bic.bic(y=Y_st, y_pred=y_theor, p=4)
-    r, prob = pearsonr(Y_st, y_theor)
-
-    parameters.append(('R_squ', R_squ))  
-    parameters.append(('AIC_crit', akaike_crit))
-    parameters.append(('BIC_crit', bayes_crit))
-    parameters.append(('R_corre', r))
-    parameters.append(('Error', error_bound))   
-    """returns list of tuples with optimal 4PL-model parameters and R_squ"""
+    parameters = fit_quality(D_st, par, '4PL', RSS, error_bound, covariance=pcov)
+    """returns FitResult with optimal 4PL-model parameters, R_squ and covariance of the parameters"""
     return (parameters)
 
-def logit_5PL_curve_fit(D_st, start_range):
+def logit_5PL_curve_fit(D_st, start_range, prior=None):
     """
     Optimization on the base of curvr_fit function
     """
+    from scipy.optimize import curve_fit
     X_st = D_st[0]
     Y_st = D_st[1]
-    def logit_func_5PL(X_st, A, B, C, D, E):
-        Y_th=D + (A - D)/((1 + (X_st/C)**B)**E)
-        return Y_th
+    """the parameters in the order of the bounds: [D, A, B, C, E]"""
+    logit_func_5PL, jac_5PL = eto.curve_fit_model('5PL')
   
     D_l = start_range['D'][0]
     D_p = start_range['D'][1]
@@ -923,36 +951,123 @@ def logit_5PL_curve_fit(D_st, start_range):
     E_p = start_range['E'][1]
 
     limits=([D_l, A_l, B_l, C_l, E_l], [D_p, A_p, B_p, C_p, E_p])
-    par, pcov = curve_fit(logit_func_5PL, X_st, Y_st, bounds=limits)        
+    p0 = fit_start(D_st, '5PL', list(zip(*limits)), prior)
+    par, pcov = curve_fit(logit_func_5PL, X_st, Y_st, bounds=limits, jac=jac_5PL, p0=p0)
 
     def avarage_5PL(X_st, par):
-        Y_new = logit_func_5PL(X_st=X_st, A=par[1], B=par[2], C=par[3], D=par[0], E=par[4])
+        Y_new = logit_func_5PL(X_st, *par)
         return  sum((Y_new-Y_st)**2)
 
     RSS=avarage_5PL(X_st, par)/len(X_st)
-    if(par[1] == A_l or par[1] == A_p or par[2] == B_l or par[2] == B_p or
-       par[3] == C_l or par[3] == C_p or par[0] == D_l or par[0] == D_p or 
-       par[4] == E_l or par[4] == E_p or RSS > 0.3):
+    if(at_range_limit(par, list(zip(*limits))) or RSS > 0.3):
         """ at least one of the parameters is equal to the range limit, error!"""
         error_bound = 1
     else:
         """ the parameters in proper range, ok"""
         error_bound = 0
 
-    parameters = [('D_par1',par[0]), ('A_par1',par[1]), ('B_par1', par[2]), ('C_par1', par[3]), 
-                  ('E_par1', par[4]), ('RSS', RSS)]
-    
-    R_squ = R_squared_5PL(D_st, parameters)    
+    parameters = fit_quality(D_st, par, '5PL', RSS, error_bound, covariance=pcov)
+    """returns FitResult with optimal 5PL-model parameters, R_squ and covariance of the parameters"""
+    return (parameters)
+
+
+#hybrid fitting stuff
+def hybrid_par_opt(D_st, start_range, model, de_options=None, prior=None):
+    """
+    The function implemented to calculate optimal LN, 4PL or 5PL model parameters with the hybrid engine:
+    a short differential evolution picks the basin and the bounded trust-region least squares converges from there
+    (et_optim.hybrid_fit). Returns FitResult with the parameters in the same layout as ln_func_par_opt,
+    logit_4PL_par_opt and logit_5PL_par_opt.
+    Function input:
+    D_st - a tuple of calibration standard values list (D_st[0]- titer concentration, D_st[1] - absorbance)
+    start_range - parameters ranges of the model
+    model - model family: LN, 4PL or 5PL
+    de_options - "DE" section of elisa-tool.conf (budget of the global search is taken from hLN, h4PL or h5PL)
+    prior - accepted parameters of the same assay (et_cache.FitStore.prior), the global search starts from their median
+    """
+    X_st = np.array(D_st[0], dtype='float64')
+    Y_st = np.array(D_st[1], dtype='float64')
+    names = eto.MODELS[model][0]
+    bounds = [(start_range[n][0], start_range[n][1]) for n in names]
+
+    settings = de_settings(de_options, 'h' + model)
+    settings['x0'] = fit_start(D_st, model, bounds, prior)
+    result = eto.hybrid_fit(model, bounds, X_st, Y_st, de_settings=settings)
+
+    RSS = result.fun/len(X_st)
+    if(at_range_limit(result.x, bounds) or RSS > 0.3):
+        """ at least one of the parameters is equal to the range limit, error!"""
+        error_bound = 1
+    else:
+        """ the parameters in proper range, ok"""
+        error_bound = 0
+
+    parameters = set_de_budget(fit_quality(D_st, result.x, model, RSS, error_bound), result, settings)
+    """returns FitResult with optimal model parameters"""
+    return (parameters)
+
+def fit_quality(D_st, par, model, RSS, error_bound, covariance=None):
+    """
+    The function implemented to calculate the goodness of fit of the LN, 4PL or 5PL model parameters from one evaluation
+    of the model (et_optim.fit_metrics); R_squ below 0.6 sets the error flag.
+    returns FitResult with the parameters, RSS, R_squ, AIC, BIC, r, the error flag and the covariance of the parameters
+    (curve_fit pcov or et_optim.parameter_covariance)
+    """
+    X_st = np.array(D_st[0], dtype='float64')
+    Y_st = np.array(D_st[1], dtype='float64')
+    names, model_func = eto.MODELS[model][0:2]
+    par = np.array(par, dtype='float64')
+    sse, R_squ, akaike_crit, bayes_crit, r = eto.fit_metrics(Y_st, model_func(par[None, :], X_st)[0], len(names))
     if(R_squ < 0.6):  error_bound = 1
-    y_theor = logit_5PL_func(X_data=X_st, param=parameters)
-    akaike_crit = aic.aic(y=Y_st, y_pred=y_theor, p=5)
-    bayes_crit = bic.bic(y=Y_st, y_pred=y_theor, p=5)
-    r, prob = pearsonr(Y_st, y_theor)
-
-    parameters.append(('R_squ', R_squ))
-    parameters.append(('AIC_crit', akaike_crit))
-    parameters.append(('BIC_crit', bayes_crit))
-    parameters.append(('R_corre', r))
-    parameters.append(('Error', error_bound))   
-    """returns list of tuples with optimal 5PL-model parameters and R_squ"""
-    return (parameters)
\ No newline at end of file
+    if covariance is None or not np.all(np.isfinite(covariance)):
+        """the covariance from the Jacobian at the optimum (DE, hybrid fits and singular curve_fit pcov)"""
+        covariance = eto.parameter_covariance(model, par, X_st, Y_st)[0]
+    return FitResult(model, par, rss=RSS, r_squ=R_squ, aic=akaike_crit, bic=bayes_crit, r_corre=r, error=error_bound,
+                     covariance=covariance)
+
+
+#batched fitting stuff
+def stack_standards(dat_models):
+    """
+    The function implemented to stack the calibration standards of K plates (outputs of data_std_format) into
+    arrays (K x n_std), plates with less standards are padded with NaN.
+    returns (X, Y)
+    """
+    n_std = max(len(d[0]) for d in dat_models)
+    X = np.full((len(dat_models), n_std), np.nan)
+    Y = np.full((len(dat_models), n_std), np.nan)
+    for k, d in enumerate(dat_models):
+        X[k, :len(d[0])] = d[0]
+        Y[k, :len(d[1])] = d[1]
+    return X, Y
+
+def batch_par_opt(dat_models, start_range, model, priors=None):
+    """
+    The function implemented to fit the LN, 4PL or 5PL model to the calibration standards of K plates at once
+    (et_optim.batch_least_squares: batched Levenberg-Marquardt from the initial estimates of every plate).
+    Returns list of K FitResult (the same layout as the curve_fit functions).
+    Function input:
+    dat_models - list of K calibration standards (outputs of data_std_format)
+    start_range - parameters ranges of the model
+    model - model family: LN, 4PL or 5PL
+    priors - list of K accepted parameters of the assay of every plate (et_cache.FitStore.prior, None for a plate without
+             stored fits), start point of the plate
+    """
+    names = eto.MODELS[model][0]
+    bounds = [(start_range[n][0], start_range[n][1]) for n in names]
+    X, Y = stack_standards(dat_models)
+    if priors is None:
+        priors = [None]*len(dat_models)
+    P0 = np.array([fit_start(d, model, bounds, prior) for d, prior in zip(dat_models, priors)])
+    P, rss, nit, converged = eto.batch_least_squares(model, X, Y, P0, bounds)
+    """goodness of fit of all of the plates at once"""
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        Y_theor = eto.MODELS[model][1](P, np.where(np.isfinite(X), X, 1.0))
+    sse, R_squ, akaike_crit, bayes_crit, r = eto.fit_metrics(Y, np.where(np.isfinite(X), Y_theor, np.nan), len(names))
+    RSS = sse/np.sum(np.isfinite(X) & np.isfinite(Y), axis=1)
+    """at least one of the parameters equal to the range limit, no convergence within maxiter, too large RSS
+       or too small R^2 is an error"""
+    error_bound = (at_range_limit(P, bounds) | ~converged | ~(RSS <= 0.3) | (R_squ < 0.6)).astype(int)
+    covariance = eto.parameter_covariance(model, P, X, Y)
+    """returns list of FitResult with optimal model parameters of every plate"""
+    return FitResult.batch(model, P, RSS, R_squ, akaike_crit, bayes_crit, r, error_bound, covariance)
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Created on October 2026
+@author:  Marek Bawiec, Grzegorz Banach
+The ELISA tool plugin: module containing differential evolution with the whole population scored in one call.
+"""
+
+__author__ = "Marek Bawiec, Grzegorz Banach"
+__copyright__ = "Copyright 2019, Physiolution Polska"
+__credits__ = [""]
+__license__ = "GPL"
+__version__ = "0.0.1"
+__maintainer__ = "Grzegorz Banach"
+__email__ = "g.banach@physiolution.pl"
+__status__ = "Production"
+
+import numpy as np
+from multiprocessing import Pool
+
+"""
+Batched models: absorbance of every row of the parameters matrix P (n_pop x n_par) at the concentrations X.
+"""
+def ln_model(P, X):
+    """returns A*ln(x)+B for every row [A, B] of P"""
+    return P[:, 0:1]*np.log(X) + P[:, 1:2]
+
+def logit_4PL_model(P, X):
+    """returns D+(A-D)/(1+(x/C)^B) for every row [D, A, B, C] of P"""
+    return P[:, 0:1] + (P[:, 1:2] - P[:, 0:1])/(1 + (X/P[:, 3:4])**P[:, 2:3])
+
+def logit_5PL_model(P, X):
+    """returns D+(A-D)/(1+(x/C)^B)^E for every row [D, A, B, C, E] of P"""
+    return P[:, 0:1] + (P[:, 1:2] - P[:, 0:1])/(1 + (X/P[:, 3:4])**P[:, 2:3])**P[:, 4:5]
+
+"""
+Batched objectives: residual sum of squares of every row of the population matrix P (n_pop x n_par)
+for the calibration standards X (concentration) and Y (absorbance). Defined on module level, so they can be pickled.
+"""
+def ln_rss(P, X, Y):
+    """returns RSS of A*ln(x)+B for every row [A, B] of P"""
+    return np.sum((ln_model(P, X) - Y)**2, axis=1)
+
+def logit_4PL_rss(P, X, Y):
+    """returns RSS of D+(A-D)/(1+(x/C)^B) for every row [D, A, B, C] of P"""
+    return np.sum((logit_4PL_model(P, X) - Y)**2, axis=1)
+
+def logit_5PL_rss(P, X, Y):
+    """returns RSS of D+(A-D)/(1+(x/C)^B)^E for every row [D, A, B, C, E] of P"""
+    return np.sum((logit_5PL_model(P, X) - Y)**2, axis=1)
+
+"""
+Batched Jacobians: derivatives of the model with respect to the parameters, array (n_pop x n_x x n_par)
+for every row of P at the concentrations X. Closed forms, so the local optimizers do not need
+an extra model evaluation per parameter (finite differences).
+"""
+def _log_ratio(X, C, T):
+    """returns (x/C)^B*ln(x/C), at x=0 the limit 0 is used instead of 0*(-inf)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(T > 0, T*np.log(X/C), 0.0)
+
+def ln_jac(P, X):
+    """returns [dY/dA, dY/dB] = [ln(x), 1] for every row [A, B] of P"""
+    shape = np.broadcast(P[:, 0:1], X).shape
+    return np.stack([np.broadcast_to(np.log(X), shape), np.ones(shape)], axis=-1)
+
+def logit_4PL_jac(P, X):
+    """returns [dY/dD, dY/dA, dY/dB, dY/dC] for every row [D, A, B, C] of P"""
+    D, A, B, C = P[:, 0:1], P[:, 1:2], P[:, 2:3], P[:, 3:4]
+    T = (X/C)**B
+    U = 1 + T
+    G = (A - D)/U**2
+    return np.stack([1 - 1/U, 1/U + 0*X, -G*_log_ratio(X, C, T), G*T*B/C], axis=-1)
+
+def logit_5PL_jac(P, X):
+    """returns [dY/dD, dY/dA, dY/dB, dY/dC, dY/dE] for every row [D, A, B, C, E] of P"""
+    D, A, B, C, E = P[:, 0:1], P[:, 1:2], P[:, 2:3], P[:, 3:4], P[:, 4:5]
+    T = (X/C)**B
+    U = 1 + T
+    V = U**-E
+    G = (A - D)*E*V/U
+    return np.stack([1 - V, V, -G*_log_ratio(X, C, T), G*T*B/C, -(A - D)*V*np.log(U)], axis=-1)
+
+"""
+model family -> (parameter names in the order of P, batched model, batched objective, batched Jacobian)
+"""
+MODELS = {'LN': (['A', 'B'], ln_model, ln_rss, ln_jac),
+          '4PL': (['D', 'A', 'B', 'C'], logit_4PL_model, logit_4PL_rss, logit_4PL_jac),
+          '5PL': (['D', 'A', 'B', 'C', 'E'], logit_5PL_model, logit_5PL_rss, logit_5PL_jac)}
+
+def fit_metrics(Y, Y_pred, n_par):
+    """
+    The function implemented to calculate the goodness of fit from one residual vector: SSE (residual sum of squares),
+    R^2 (as sklearn.metrics.r2_score), AIC = n*ln(SSE/n) + 2*p and BIC = n*ln(SSE/n) + p*ln(n) (as RegscorePy)
+    and the Pearson correlation r of Y and Y_pred (as scipy.stats.pearsonr).
+    Works along the last axis, so arrays (K x n_std) give the metrics of K fits at once; NaN marks a missing standard.
+    returns tuple of arrays (or floats for 1-D input): (sse, r_squ, aic, bic, r)
+    """
+    Y = np.asarray(Y, dtype='float64')
+    Y_pred = np.asarray(Y_pred, dtype='float64')
+    valid = np.isfinite(Y) & np.isfinite(Y_pred)
+    n = np.sum(valid, axis=-1)
+    Y = np.where(valid, Y, 0.0)
+    Y_pred = np.where(valid, Y_pred, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dy = np.where(valid, Y - (np.sum(Y, axis=-1)/n)[..., None], 0.0)
+        dp = np.where(valid, Y_pred - (np.sum(Y_pred, axis=-1)/n)[..., None], 0.0)
+        sse = np.sum((Y_pred - Y)**2, axis=-1)
+        syy = np.sum(dy*dy, axis=-1)
+        r_squ = 1.0 - sse/syy
+        log_likelihood = n*np.log(sse/n)
+        aic = log_likelihood + 2*n_par
+        bic = log_likelihood + n_par*np.log(n)
+        r = np.sum(dy*dp, axis=-1)/np.sqrt(syy*np.sum(dp*dp, axis=-1))
+    return (sse, r_squ, aic, bic, r)
+
+def initial_guess(model, X, Y):
+    """
+    The function implemented to estimate the parameters of the model family directly from the calibration standards:
+    LN - least squares line of the absorbance against ln(x) (exact optimum of the LN model);
+    4PL, 5PL - A, D from the min/max absorbance (the lowest concentration gives the side of A), C from the concentration
+    of the mid response (interpolated in ln(x)), B from the slope of the linearized curve ln((A-y)/(y-D)) = B*ln(x/C)
+    in its middle (10-90% of the response), E = 1 (symmetric curve).
+    returns 1-D array with the parameters in the order of MODELS
+    """
+    X = np.asarray(X, dtype='float64')
+    Y = np.asarray(Y, dtype='float64')
+    order = np.argsort(X, kind='mergesort')
+    X, Y = X[order], Y[order]
+    positive = X > 0
+    if model == 'LN':
+        if np.count_nonzero(positive) >= 2:
+            slope, intercept = np.polyfit(np.log(X[positive]), Y[positive], 1)
+        else:
+            slope, intercept = 0.0, np.mean(Y)
+        return np.array([slope, intercept])
+    y_range = np.max(Y) - np.min(Y)
+    margin = 0.05*y_range if y_range > 0 else 1e-3
+    if Y[-1] >= Y[0]:
+        A, D = np.min(Y) - margin, np.max(Y) + margin
+    else:
+        A, D = np.max(Y) + margin, np.min(Y) - margin
+    log_x = np.log(X[positive])
+    y_pos = Y[positive]
+    C = np.exp(np.mean(log_x)) if len(log_x) else 1.0
+    above = (y_pos - (A + D)/2)*np.sign(D - A) > 0
+    cross = np.nonzero(above[1:] & ~above[:-1])[0]
+    if len(cross):
+        k = cross[0]
+        t = ((A + D)/2 - y_pos[k])/(y_pos[k + 1] - y_pos[k])
+        C = np.exp(log_x[k] + t*(log_x[k + 1] - log_x[k]))
+    B = 1.0
+    fraction = (y_pos - A)/(D - A)
+    middle = (fraction > 0.1) & (fraction < 0.9)
+    if np.count_nonzero(middle) < 2:
+        middle = (fraction > 0) & (fraction < 1)
+    if np.count_nonzero(middle) >= 2 and np.ptp(log_x[middle]) > 0:
+        slope = np.polyfit(log_x[middle], np.log((A - y_pos[middle])/(y_pos[middle] - D)), 1)[0]
+        if np.isfinite(slope) and slope > 0:
+            B = slope
+    guess = [D, A, B, C]
+    if model == '5PL':
+        guess.append(1.0)
+    return np.array(guess)
+
+def residuals(p, model, X, Y):
+    """returns residuals model(p, X) - Y of one parameters vector p for the model family (least_squares objective)"""
+    return MODELS[model][1](np.asarray(p, dtype='float64')[None, :], X)[0] - Y
+
+def residuals_jac(p, model, X, Y):
+    """returns Jacobian (n_x x n_par) of the residuals of one parameters vector p (least_squares jac, Y is not used)"""
+    return MODELS[model][3](np.asarray(p, dtype='float64')[None, :], X)[0]
+
+def curve_fit_model(model):
+    """
+    returns pair (f, jac) of functions in the scipy.optimize.curve_fit convention f(X, *p), jac(X, *p)
+    for the model family with the parameters in the order of MODELS
+    """
+    names, model_func, rss_func, jac_func = MODELS[model]
+    def f(X, *p):
+        return model_func(np.array(p, dtype='float64')[None, :], X)[0]
+    def jac(X, *p):
+        return jac_func(np.array(p, dtype='float64')[None, :], X)[0]
+    return f, jac
+
+def jacobian_check(model, p, X, step=1e-6):
+    """
+    The function implemented to compare the closed-form Jacobian of the model with central finite differences.
+    returns the largest absolute difference (relative to the largest derivative)
+    """
+    names, model_func, rss_func, jac_func = MODELS[model]
+    p = np.asarray(p, dtype='float64')
+    analytic = jac_func(p[None, :], X)[0]
+    numeric = np.empty_like(analytic)
+    for k in range(len(p)):
+        h = step*max(1.0, abs(p[k]))
+        up, down = p.copy(), p.copy()
+        up[k] += h
+        down[k] -= h
+        numeric[:, k] = (model_func(up[None, :], X)[0] - model_func(down[None, :], X)[0])/(2*h)
+    return np.max(np.abs(analytic - numeric))/max(1.0, np.max(np.abs(analytic)))
+
+"""
+Batched slopes: derivative of the model with respect to the concentration dY/dx for every row of P at the
+concentrations X (x > 0), used to propagate the uncertainty through the reverse (absorbance -> concentration) function.
+"""
+def ln_slope(P, X):
+    """returns dY/dx = A/x for every row [A, B] of P"""
+    return P[:, 0:1]/X
+
+def logit_4PL_slope(P, X):
+    """returns dY/dx = -(A-D)*B*(x/C)^B/(x*(1+(x/C)^B)^2) for every row [D, A, B, C] of P"""
+    D, A, B, C = P[:, 0:1], P[:, 1:2], P[:, 2:3], P[:, 3:4]
+    T = (X/C)**B
+    return -(A - D)*B*T/(X*(1 + T)**2)
+
+def logit_5PL_slope(P, X):
+    """returns dY/dx = -(A-D)*E*B*(x/C)^B/(x*(1+(x/C)^B)^(E+1)) for every row [D, A, B, C, E] of P"""
+    D, A, B, C, E = P[:, 0:1], P[:, 1:2], P[:, 2:3], P[:, 3:4], P[:, 4:5]
+    T = (X/C)**B
+    return -(A - D)*E*B*T/(X*(1 + T)**(E + 1))
+
+SLOPES = {'LN': ln_slope, '4PL': logit_4PL_slope, '5PL': logit_5PL_slope}
+
+"""
+Batched reverse models: concentration of the absorbances Y (n_pop x n_y) for every row of P (as et_calc.*_concentration),
+NaN outside of the range of the curve.
+"""
+def ln_inverse(P, Y):
+    """returns x = exp((y-B)/A) for every row [A, B] of P"""
+    return np.exp((Y - P[:, 1:2])/P[:, 0:1])
+
+def logit_4PL_inverse(P, Y):
+    """returns x = C*((A-D)/(y-D)-1)^(1/B) for every row [D, A, B, C] of P"""
+    D, A, B, C = P[:, 0:1], P[:, 1:2], P[:, 2:3], P[:, 3:4]
+    return C*((A - D)/(Y - D) - 1)**(1/B)
+
+def logit_5PL_inverse(P, Y):
+    """returns x = C*(((A-D)/(y-D))^(1/E)-1)^(1/B) for every row [D, A, B, C, E] of P"""
+    D, A, B, C, E = P[:, 0:1], P[:, 1:2], P[:, 2:3], P[:, 3:4], P[:, 4:5]
+    return C*(((A - D)/(Y - D))**(1/E) - 1)**(1/B)
+
+INVERSES = {'LN': ln_inverse, '4PL': logit_4PL_inverse, '5PL': logit_5PL_inverse}
+
+def parameter_covariance(model, P, X, Y):
+    """
+    The function implemented to estimate the covariance of the fitted parameters from the Jacobian at the optimum:
+    s^2*(J^T J)^-1 with s^2 = SSE/(n - n_par), as scipy.optimize.curve_fit (absolute_sigma=False) does.
+    The pseudo-inverse is taken from the eigen decomposition of J^T J (stacked, numpy >= 1.8), so K fits
+    (P: K x n_par, X, Y: K x n_std, NaN marks a missing standard) are handled at once and a degenerate
+    direction (parameter at a flat part of the curve) does not raise.
+    returns array (K x n_par x n_par), NaN where there are not more standards than parameters
+    """
+    P = np.atleast_2d(np.asarray(P, dtype='float64'))
+    X = np.atleast_2d(np.asarray(X, dtype='float64'))
+    Y = np.atleast_2d(np.asarray(Y, dtype='float64'))
+    names, model_func, rss_func, jac_func = MODELS[model]
+    valid = np.isfinite(X) & np.isfinite(Y)
+    X_in = np.where(valid, X, 1.0)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        res = np.where(valid, model_func(P, X_in) - Y, 0.0)
+        J = np.where(valid[..., None], jac_func(P, X_in), 0.0)
+    dof = np.sum(valid, axis=1) - len(names)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s2 = np.where(dof > 0, np.sum(res*res, axis=1)/dof, np.nan)
+    w, V = np.linalg.eigh(np.einsum('kni,knj->kij', J, J))
+    cutoff = np.finfo('float64').eps*len(names)*np.max(np.abs(w), axis=1, keepdims=True)
+    w_inv = np.where(w > cutoff, 1.0/np.where(w > cutoff, w, 1.0), 0.0)
+    """returns covariance matrices of the parameters"""
+    return np.einsum('kij,kj,klj->kil', V, w_inv, V)*s2[:, None, None]
+
+def concentration_se(model, p, covariance, X, Y_var):
+    """
+    The function implemented to calculate the delta-method standard error of the back-calculated concentrations X
+    (reverse function of the model with the parameters p) for all of the samples at once.
+    The reverse function x(y, p) is differentiated through the model: dx/dp = -(dY/dp)/(dY/dx), dx/dy = 1/(dY/dx), so
+    var(x) = (dx/dp)^T covariance (dx/dp) + (dx/dy)^2*Y_var, where Y_var is the variance of the mean absorbance.
+    returns array of the standard errors (NaN where the slope of the curve is 0 or the covariance is unknown)
+    """
+    names, model_func, rss_func, jac_func = MODELS[model]
+    p = np.asarray(p, dtype='float64')[None, :]
+    X = np.asarray(X, dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        slope = SLOPES[model](p, X)[0]
+        G = -jac_func(p, X)[0]/slope[:, None]
+        var_x = np.einsum('ni,ij,nj->n', G, np.asarray(covariance, dtype='float64'), G) + Y_var/slope**2
+        return np.sqrt(var_x)
+
+
+def evaluate(func, P, args=(), pool=None, workers=1):
+    """
+    The function implemented to score the population, not finite values (e.g. 0/0 at the range limits) are replaced by inf.
+    With a multiprocessing pool the rows of P are split into workers chunks scored in parallel
+    (the result does not depend on the number of workers).
+    """
+    if pool is not None and workers > 1 and len(P) >= workers:
+        chunks = pool.map(_evaluate_chunk, [(func, chunk, args) for chunk in np.array_split(P, workers)])
+        """returns 1-D array of the objective values"""
+        return np.concatenate(chunks)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        energies = np.asarray(func(P, *args), dtype='float64')
+    """returns 1-D array of the objective values"""
+    return np.where(np.isfinite(energies), energies, np.inf)
+
+def _evaluate_chunk(job):
+    """pool worker: scores one chunk of the population"""
+    func, P, args = job
+    return evaluate(func, P, args)
+
+def _random_indices(rng, n_pop, n_pick):
+    """returns (n_pop x n_pick) array of distinct population indices, row i never contains i"""
+    keys = rng.random_sample((n_pop, n_pop))
+    keys[np.arange(n_pop), np.arange(n_pop)] = np.inf
+    return np.argpartition(keys, n_pick, axis=1)[:, :n_pick]
+
+def _latin_hypercube(rng, n_pop, n_par):
+    """returns initial population in the unit cube, every parameter range is split into n_pop segments"""
+    segments = (rng.random_sample((n_pop, n_par)) + np.arange(n_pop)[:, None]) / n_pop
+    population = np.empty_like(segments)
+    for j in range(n_par):
+        population[:, j] = segments[rng.permutation(n_pop), j]
+    return population
+
+
+def differential_evolution(func, bounds, args=(), strategy='best2bin', maxiter=1000, popsize=15, tol=0.01,
+                           mutation=(0.5, 1.0), recombination=0.7, seed=None, polish=True, atol=0.0, workers=1,
+                           stall_generations=0, stall_rtol=0.0, spread_tol=0.0, x0=None):
+    """
+    The function implemented to find the global minimum of a batched objective with differential evolution (best2bin).
+    Works as scipy.optimize.differential_evolution, but a whole generation of trial vectors is scored in one call
+    func(P, *args), where P is the (n_pop x n_par) population matrix, and the population is updated once per generation.
+    Function input:
+    func - batched objective, returns 1-D array with one value for every row of P
+    bounds - list of (min, max) pairs for every parameter
+    args - extra arguments of func
+    maxiter - maximal number of generations
+    popsize - population size is popsize*number_of_parameters
+    tol, atol - the search stops when std(energies) <= atol + tol*|mean(energies)| and the population has collapsed
+                (largest std of a parameter <= tol in units of its range; a flat plateau of the RSS does not stop the search)
+    mutation - mutation constant or (min, max) range for dithering (new constant every generation)
+    recombination - crossover probability
+    seed - seed of numpy.random.RandomState, the same seed gives the same result
+    polish - the best member is finally polished with L-BFGS-B (scipy.optimize.minimize)
+    workers - number of processes scoring the population (func and args must be picklable, e.g. the *_rss functions)
+    stall_generations, stall_rtol - the search stops when the best energy improved by less than stall_rtol*|best|
+                                    for stall_generations generations in a row (0 - not used)
+    spread_tol - the search stops when the population spread (largest std of a parameter, in units of its range)
+                 drops below spread_tol (0 - not used)
+    x0 - start point (e.g. initial_guess), replaces the first member of the initial population (clipped to the bounds)
+    """
+    if strategy != 'best2bin':
+        raise ValueError("Only the 'best2bin' strategy is implemented, got: " + str(strategy))
+    rng = np.random.RandomState(seed)
+    limits = np.array(bounds, dtype='float64')
+    lower = limits[:, 0]
+    span = limits[:, 1] - limits[:, 0]
+    n_par = len(limits)
+    n_pop = max(5, popsize*n_par)
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        x, fun, nit, nfev, converged, message = _evolve(func, args, lower, span, n_pop, n_par, rng, maxiter, tol, atol,
+                                                        mutation, recombination, pool, workers,
+                                                        stall_generations, stall_rtol, spread_tol, x0)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if polish:
+        from scipy.optimize import minimize
+        polished = minimize(lambda p: evaluate(func, p[None, :], args)[0], x, method='L-BFGS-B', bounds=limits.tolist())
+        nfev += polished.nfev
+        if polished.fun < fun:
+            x = np.clip(polished.x, limits[:, 0], limits[:, 1])
+            fun = evaluate(func, x[None, :], args)[0]
+    from scipy.optimize import OptimizeResult
+    """returns scipy.optimize.OptimizeResult (x, fun, nit, nfev, success, message and n_pop - the population size)"""
+    return OptimizeResult(x=x, fun=fun, nit=nit, nfev=nfev, success=converged, message=message, n_pop=n_pop)
+
+def _evolve(func, args, lower, span, n_pop, n_par, rng, maxiter, tol, atol, mutation, recombination, pool, workers,
+            stall_generations, stall_rtol, spread_tol, x0=None):
+    """
+    The generations loop of differential_evolution,
+    returns (best x, best energy, generations, evaluations, converged, message).
+    """
+    population = _latin_hypercube(rng, n_pop, n_par)
+    if x0 is not None:
+        population[0] = np.clip((np.asarray(x0, dtype='float64') - lower)/span, 0.0, 1.0)
+    energies = evaluate(func, lower + population*span, args, pool, workers)
+    nfev = n_pop
+    nit = 0
+    converged = False
+    message = 'Maximum number of iterations has been exceeded.'
+    best_energy = np.min(energies)
+    stalled = 0
+    while nit < maxiter:
+        nit += 1
+        if np.size(mutation) == 2:
+            scale = rng.uniform(mutation[0], mutation[1])
+        else:
+            scale = mutation
+        best = population[np.argmin(energies)]
+        r = _random_indices(rng, n_pop, 4)
+        mutant = best + scale*(population[r[:, 0]] + population[r[:, 1]] - population[r[:, 2]] - population[r[:, 3]])
+        """binomial crossover, at least one parameter comes from the mutant"""
+        crossover = rng.random_sample((n_pop, n_par)) < recombination
+        crossover[np.arange(n_pop), rng.randint(0, n_par, size=n_pop)] = True
+        trial = np.where(crossover, mutant, population)
+        """parameters out of the range are drawn again"""
+        out = (trial < 0.0) | (trial > 1.0)
+        trial[out] = rng.random_sample(np.count_nonzero(out))
+
+        trial_energies = evaluate(func, lower + trial*span, args, pool, workers)
+        nfev += n_pop
+        better = trial_energies < energies
+        population[better] = trial[better]
+        energies[better] = trial_energies[better]
+
+        finite = energies[np.isfinite(energies)]
+        spread = np.max(np.std(population, axis=0))
+        if (len(finite) == n_pop and np.std(finite) <= atol + tol*np.abs(np.mean(finite))
+                and spread <= tol):
+            converged = True
+            message = 'Optimization terminated successfully.'
+            break
+        new_best = np.min(energies)
+        if np.isfinite(new_best) and best_energy - new_best <= stall_rtol*np.abs(best_energy):
+            stalled += 1
+        else:
+            stalled = 0
+        best_energy = new_best
+        if stall_generations > 0 and stalled >= stall_generations:
+            converged = True
+            message = 'Best energy stalled for ' + str(stalled) + ' generations.'
+            break
+        if spread <= spread_tol:
+            converged = True
+            message = 'Population spread dropped below spread_tol.'
+            break
+
+    k_best = np.argmin(energies)
+    return (lower + population[k_best]*span, energies[k_best], nit, nfev, converged, message)
+
+def hybrid_fit(model, bounds, X, Y, de_settings=None):
+    """
+    The function implemented to fit the model with a short differential evolution (global basin search, no L-BFGS-B polish)
+    followed by the bounded trust-region least squares polish (scipy.optimize.least_squares, method='trf').
+    Function input:
+    model - model family (key of MODELS)
+    bounds - list of (min, max) pairs for every parameter
+    X, Y - concentrations and absorbances of the calibration standards
+    de_settings - keyword arguments of differential_evolution (budget, workers, seed)
+    """
+    from scipy.optimize import least_squares
+    rss_func = MODELS[model][2]
+    if de_settings is None:
+        de_settings = {}
+    result = differential_evolution(rss_func, bounds, args=(X, Y), polish=False, **de_settings)
+    limits = np.array(bounds, dtype='float64')
+    try:
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            polished = least_squares(residuals, result.x, jac=residuals_jac, args=(model, X, Y),
+                                     bounds=(limits[:, 0], limits[:, 1]), method='trf')
+        result.nfev += polished.nfev
+        fun = evaluate(rss_func, polished.x[None, :], (X, Y))[0]
+        if fun <= result.fun:
+            result.x = polished.x
+            result.fun = fun
+    except ValueError:
+        """not finite residuals at the start point (e.g. C=0), the DE result is kept"""
+        pass
+    """returns scipy.optimize.OptimizeResult of differential_evolution with the polished x and fun"""
+    return result
+
+def batch_least_squares(model, X, Y, P0, bounds, maxiter=200, ftol=1e-12, xtol=1e-12, damping=1e-3):
+    """
+    The function implemented to fit the model to K calibration curves at once with the projected Levenberg-Marquardt
+    method (the closed-form Jacobians of MODELS, one batched linear solve per iteration for all of the active curves).
+    Every curve has its own damping and convergence mask, converged curves are not evaluated any more.
+    Function input:
+    model - model family (key of MODELS)
+    X, Y - arrays (K x n_std) of the concentrations and absorbances of the standards, NaN marks a missing standard
+           (curves with different number of standards are padded with NaN)
+    P0 - array (K x n_par) of the start points
+    bounds - list of (min, max) pairs for every parameter (the same for all curves)
+    maxiter - maximal number of iterations
+    ftol, xtol - a curve has converged when the relative decrease of its RSS is below ftol or its relative step is below xtol
+    damping - initial Levenberg-Marquardt damping
+    returns (P - array K x n_par, rss - array K, nit - iterations of every curve, converged - boolean array K)
+    """
+    names, model_func, rss_func, jac_func = MODELS[model]
+    X = np.atleast_2d(np.asarray(X, dtype='float64'))
+    Y = np.atleast_2d(np.asarray(Y, dtype='float64'))
+    limits = np.array(bounds, dtype='float64')
+    P = np.clip(np.array(P0, dtype='float64'), limits[:, 0], limits[:, 1])
+    valid = np.isfinite(X) & np.isfinite(Y)
+    X = np.where(valid, X, 1.0)
+    Y = np.where(valid, Y, 0.0)
+    n_curves, n_par = P.shape
+    eye = np.eye(n_par)
+
+    def batch_rss(P, rows):
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            r = np.where(valid[rows], model_func(P, X[rows]) - Y[rows], 0.0)
+        rss = np.sum(r**2, axis=1)
+        return r, np.where(np.isfinite(rss), rss, np.inf)
+
+    r, rss = batch_rss(P, np.arange(n_curves))
+    lam = np.full(n_curves, damping)
+    nit = np.zeros(n_curves, dtype='intp')
+    converged = np.zeros(n_curves, dtype=bool)
+    active = np.isfinite(rss)
+    residual = np.where(np.isfinite(r), r, 0.0)
+    for it in range(maxiter):
+        rows = np.nonzero(active)[0]
+        if len(rows) == 0:
+            break
+        nit[rows] += 1
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            J = jac_func(P[rows], X[rows])*valid[rows][:, :, None]
+        J = np.where(np.isfinite(J), J, 0.0)
+        JTJ = np.einsum('knp,knq->kpq', J, J)
+        grad = np.einsum('knp,kn->kp', J, residual[rows])
+        diag = np.einsum('kpp->kp', JTJ)
+        """Marquardt scaling of the damping, a tiny ridge keeps flat directions solvable"""
+        A = JTJ + (lam[rows][:, None]*diag + 1e-12*(1.0 + diag))[:, :, None]*eye
+        step = -np.linalg.solve(A, grad[:, :, None])[:, :, 0]
+        trial = np.clip(P[rows] + step, limits[:, 0], limits[:, 1])
+        r_trial, rss_trial = batch_rss(trial, rows)
+        better = rss_trial < rss[rows]
+        moved = np.max(np.abs(trial - P[rows])/(np.abs(P[rows]) + xtol), axis=1)
+        decrease = (rss[rows] - rss_trial)/np.maximum(rss[rows], 1e-300)
+        accepted = rows[better]
+        P[accepted] = trial[better]
+        rss[accepted] = rss_trial[better]
+        residual[accepted] = r_trial[better]
+        lam[accepted] = np.maximum(lam[accepted]/3.0, 1e-12)
+        lam[rows[~better]] *= 3.0
+        done = (better & (decrease < ftol)) | (moved < xtol) | (lam[rows] > 1e12)
+        converged[rows[done]] = True
+        active[rows[done]] = False
+    return P, rss, nit, converged
@@ -16,78 +16,173 @@ __maintainer__ = "Grzegorz Banach"
 __email__ = "g.banach@physiolution.pl"
 __status__ = "Production"
 
+import numpy as np
 import pandas as pd
-import re
 from string import digits
+from multiprocessing import Pool
 
-def tekan_data_check(filepath):
+"""
+Anchors of the data tables: <> measurement results (TEKAN file), <_> multiwell plate map,
+<|> calibration standards and <||> samples specification (excel_config file)
+"""
+TABLE_MARKERS = ['<>', '<_>', '<|>', '<||>']
+"""
+Keys of the headers and footers information placed in the excel_config file
+"""
+PDF_LEGEND_KEYS = ['SOP_name', 'SOP_version', 'RESEARCH_name', 'TEMPLATE_version', 'EFFECTIVE',
+                   'DATE_of_exp', 'TEST_No', 'PROJECT_NAME', 'PERFORMED_BY']
+
+def build_marker_index(dat, tokens=TABLE_MARKERS + PDF_LEGEND_KEYS):
+    """
+    The function implemented to find all of the workbook anchors in one vectorized scan of the parsed sheet.
+    Function input:
+    dat - DataFrame parsed from TEKAN or excel_config xlsx-file
+    tokens - list of the searched anchors
+    """
+    cells = pd.Series(dat.values.ravel())
+    hits = np.flatnonzero(cells.isin(tokens).values)
+    n_col = dat.shape[1]
+    marker_index = {}
+    for pos in hits:
+        row, col = divmod(int(pos), n_col)
+        marker_index.setdefault(cells.iat[pos], []).append((row, col))
+    """returns dictionary: anchor -> list of (row, column) integer positions in row-major order"""
+    return (marker_index)
+
+def marker_position(marker_index, token):
+    """
+    The function returns the position of the first occurrence of the anchor or None if the anchor is absent.
+    """
+    pos = marker_index.get(token)
+    if not pos:
+        return None
+    return pos[0]
+
+def normalize_labels(labels):
+    """
+    The function implemented to bring the labels of the plate map, standards and specification to one notation in a single vectorized pass:
+    all non-alphanumeric characters (spaces included) are removed and all case-based characters are lowercased.
+    Function input:
+    labels - Series or 1-D array of labels
+    """
+    labels = pd.Series(labels).astype(str)
+    """returns Series with the normalized labels"""
+    return labels.str.replace(r'[^\w]', '', regex=True).str.lower()
+
+def label_codes(imp_data_map):
+    """
+    The function implemented to turn the normalized multiwell plate map into categorical integer codes,
+    so that further lookups work on integers instead of repeated string comparisons.
+    Function input:
+    imp_data_map - DataFrame with multiwell plate map
+    """
+    categorical = pd.Categorical(imp_data_map.values.ravel())
+    codes = np.asarray(categorical.codes).reshape(imp_data_map.shape)
+    """returns 2-D array of codes (plate shape) and list of labels (code -> label, sorted)"""
+    return (codes, list(categorical.categories))
+
+def build_well_index(imp_data_map):
+    """
+    The function implemented to build the inverted index of the multiwell plate map: label -> wells with this label.
+    Wells are numbered row-major (well = row*number_of_columns + column), so the same numbers address the flattened measurement results.
+    Function input:
+    imp_data_map - DataFrame with multiwell plate map
+    """
+    codes, labels = label_codes(imp_data_map)
+    """returns dictionary: label -> array of well numbers in row-major order"""
+    return codes_to_well_index(codes, labels)
+
+def codes_to_well_index(codes, labels):
+    """
+    The function implemented to group the wells by the label codes (see label_codes and build_well_index).
+    """
+    flat = np.asarray(codes).ravel()
+    order = np.argsort(flat, kind='mergesort')
+    bounds = np.cumsum(np.bincount(flat, minlength=len(labels)))[:-1]
+    """returns dictionary: label -> array of well numbers in row-major order"""
+    return dict(zip(labels, np.split(order, bounds)))
+
+def well_positions(well_index, imp_data_map, label):
+    """
+    The function implemented to return the positions (e.g. A-1) of all wells with the given label.
+    """
+    n_col = imp_data_map.shape[1]
+    row_names = imp_data_map.index
+    col_names = imp_data_map.columns
+    wells = well_index.get(label, [])
+    """returns list of position strings"""
+    return [str(row_names[w // n_col]) + "-" + str(col_names[w % n_col]) for w in wells]
+
+def tekan_data_check(filepath, dat=None, markers=None):
     """
     Function implemented to check the validity of initial TEKAN output raw data_file.
     #Function input:
     filepath - filepath to the file from TEKAN output xlsx measurement file
+    dat, markers - already parsed DataFrame and its marker index (optional)
     """
-    pars_dat=pd.read_excel(filepath)
+    if markers is None:
+        if dat is None:
+            dat=pd.read_excel(filepath)
+        markers=build_marker_index(dat)
     filetype=filepath.endswith('.xlsx')
-    pos_0=pars_dat[pars_dat =='<>'].stack().index.tolist()
     
-    exc=((not filetype) or (not pos_0))
+    exc=((not filetype) or ('<>' not in markers))
     """returns TRUE if bad data were given"""
     return (exc)
 
-def config_data_check_0(filepath):
+def config_data_check_0(filepath, dat=None, markers=None):
     """
     Function implemented to check the data formatting essential for calculations in the xlsx-config file.
     Function input:
     filepath - filepath to excel_config file filled by the laboratory assistant
+    dat, markers - already parsed DataFrame and its marker index (optional)
     """
-    pars_dat=pd.read_excel(filepath)
+    if markers is None:
+        if dat is None:
+            dat=pd.read_excel(filepath)
+        markers=build_marker_index(dat)
     filetype=filepath.endswith('.xlsx')
-    pos_0=pars_dat[pars_dat =='<||>'].stack().index.tolist()
-    pos_1=pars_dat[pars_dat =='<_>'].stack().index.tolist()
-    pos_2=pars_dat[pars_dat =='<|>'].stack().index.tolist()
-    exc=((not filetype) or (not pos_1)) or ((not pos_0) or (not pos_2))
+    exc=(not filetype) or any(m not in markers for m in ['<||>', '<_>', '<|>'])
     
     """Returns TRUE if bad data were given"""
     return (exc)
 
-def config_data_check_1(filepath):
+def config_data_check_1(filepath, dat=None, markers=None):
     """
     Function implemented  to check the data formatting essential for pdf-creation in the xlsx-config file.
     Function input:
     filepath - filepath to excel_config file filled by the laboratory assistant
+    dat, markers - already parsed DataFrame and its marker index (optional)
     """
-    pars_dat=pd.read_excel(filepath)
-    pos_0=pars_dat[pars_dat =='SOP_name'].stack().index.tolist()
-    pos_1=pars_dat[pars_dat =='SOP_version'].stack().index.tolist()
-    pos_2=pars_dat[pars_dat =='RESEARCH_name'].stack().index.tolist()
-    pos_3=pars_dat[pars_dat =='TEMPLATE_version'].stack().index.tolist()
-    pos_4=pars_dat[pars_dat =='EFFECTIVE'].stack().index.tolist()
-    pos_5=pars_dat[pars_dat =='DATE_of_exp'].stack().index.tolist()
-    pos_6=pars_dat[pars_dat =='TEST_No'].stack().index.tolist()
-    pos_7=pars_dat[pars_dat =='PROJECT_NAME'].stack().index.tolist()
-    pos_8=pars_dat[pars_dat =='PERFORMED_BY'].stack().index.tolist()
+    if markers is None:
+        if dat is None:
+            dat=pd.read_excel(filepath)
+        markers=build_marker_index(dat)
 # To do przepisania!!!
-#    pos_9=pars_dat[pars_dat =='ABS_MAX'].stack().index.tolist()
-#    pos_10=pars_dat[pars_dat =='ABS_MIN'].stack().index.tolist()
-    exc=((not pos_3) or (not pos_4) or ((not pos_1)) or (((not pos_0) or (not pos_2)) or ((not pos_5) or (not pos_6))) or ((not pos_7) or (not pos_8)))
+#   'ABS_MAX', 'ABS_MIN'
+    exc=any(nam not in markers for nam in PDF_LEGEND_KEYS)
     
     """returns TRUE if bad data were given"""
     return (exc)
 
-def extract_pdf_legend(filepath):
+def extract_pdf_legend(filepath=None, dat=None, markers=None):
     """
     Function implemented for supporting information extracting.
     Function input:
     filepath - filepath to excel_config file filled by the laboratory assistant
-    """
-    pars_dat=pd.read_excel(filepath)
+    dat - DataFrame already parsed from the excel_config file (if given, the file is not read again)
+    markers - marker index of dat (optional)
+    """
+    if dat is None:
+        dat=pd.read_excel(filepath)
+    pars_dat=dat
+    if markers is None:
+        markers=build_marker_index(pars_dat)
     
-    pdf_pars=['SOP_name','SOP_version','RESEARCH_name','TEMPLATE_version','EFFECTIVE', 'DATE_of_exp','TEST_No','PROJECT_NAME','PERFORMED_BY']
     pdf_legend={}
     
-    for nam in pdf_pars:
-        pos=pars_dat[pars_dat ==nam].stack().index.tolist()
-        start_pos=(pos[0][0],pars_dat.columns.get_loc(pos[0][1]))
+    for nam in PDF_LEGEND_KEYS:
+        start_pos=marker_position(markers, nam)
         nam_val=str(pars_dat.iloc[start_pos[0],start_pos[1]+1])
         if nam_val =='nan':
             nam_val=' '
@@ -98,127 +193,180 @@ def extract_pdf_legend(filepath):
     """returns output in the dictionary format"""  
     return(pdf_legend)
     
-def extract_meas_res(dat):
+"""
+Supported multiwell plates: number of wells -> (rows, columns)
+"""
+PLATE_FORMATS = {96: (8, 12), 384: (16, 24), 1536: (32, 48)}
+
+def _column_number(cell):
+    """returns number in the header cell of the plate table (e.g. 1, 1.0 or '1') or None for other cells"""
+    if isinstance(cell, bool):
+        return None
+    try:
+        return float(cell)
+    except (TypeError, ValueError):
+        return None
+
+def plate_geometry(dat, start_pos, marker='<>', sheet=None):
+    """
+    The function implemented to detect the plate format from the table anchored by the marker at start_pos.
+    Only the consecutive header cells numbered 1, 2, ..., N are counted as columns (notes typed next to the table
+    are not), N is snapped to the largest plate width of PLATE_FORMATS not above it and the rows are counted along
+    the row names column up to the number of rows of that plate format.
+    Function input:
+    dat - DataFrame parsed from TEKAN or excel_config xlsx-file
+    start_pos - (row, column) position of the marker
+    marker, sheet - marker and sheet name of the table, used in the error message
+    """
+    header = dat.iloc[start_pos[0], start_pos[1]+1:].values
+    n_numbered = 0
+    while n_numbered < len(header) and _column_number(header[n_numbered]) == n_numbered + 1:
+        n_numbered = n_numbered + 1
+    formats = [rc for rc in sorted(PLATE_FORMATS.values(), key=lambda rc: rc[1]) if rc[1] <= n_numbered]
+    if not formats:
+        raise ValueError("Plate table %s%s (row %d, column %d): the header row should number the columns 1, 2, ..., N "
+                         "of a %s-well plate, found %d numbered columns"
+                         % (marker, '' if sheet is None else ' of sheet ' + str(sheet), start_pos[0], start_pos[1],
+                            ', '.join(str(n) for n in sorted(PLATE_FORMATS)), n_numbered))
+    n_rows_of_format, n_col = formats[-1]
+    row_names = dat.iloc[start_pos[0]+1:start_pos[0]+1+n_rows_of_format, start_pos[1]].values
+    n_row = 0
+    while n_row < len(row_names) and not pd.isna(row_names[n_row]):
+        n_row = n_row + 1
+    """returns number of rows and columns of the plate table"""
+    return (n_row, n_col)
+
+def extract_plate_table(dat, start_pos, marker='<>', sheet=None):
+    """
+    The function implemented to cut the whole plate table anchored at start_pos in one slice of the underlying array.
+    Function input:
+    dat - DataFrame parsed from TEKAN or excel_config xlsx-file
+    start_pos - (row, column) position of the marker
+    marker, sheet - marker and sheet name of the table (for the error messages of plate_geometry)
+    """
+    n_row, n_col = plate_geometry(dat, start_pos, marker, sheet)
+    r0 = start_pos[0] + 1
+    c0 = start_pos[1] + 1
+    row_names = dat.iloc[r0:r0+n_row, start_pos[1]].values.tolist()
+    """the header cells are checked by plate_geometry to be 1, 2, ..., n_col"""
+    imp_table = pd.DataFrame(dat.iloc[r0:r0+n_row, c0:c0+n_col].values,
+                             index=pd.Index(row_names, name='raw_names'),
+                             columns=[str(k + 1) for k in range(n_col)])
+    """returns DataFrame (rows x columns of the plate) with types inferred per column"""
+    return (imp_table.infer_objects())
+
+def extract_meas_res(dat, markers=None):
     """
     The function implemented for measurement results extracting from the data parsed from a TEKAN raw xlsx-datafile.
+    Plate format (96, 384 or 1536 wells) is detected from the marked table.
     Function input:
     dat - DataFrame with the data imported from TEKAN output measurement file
+    markers - marker index of dat (optional)
     """
-    pos_0=dat[dat=='<>'].stack().index.tolist()
-    start_pos=(pos_0[0][0],dat.columns.get_loc(pos_0[0][1]))
-    imp_data=pd.DataFrame()
-    N=0
-    while ((N<13) and ((start_pos[1]+N) < (dat.shape[1]))) and (not(pd.isna(dat.iloc[start_pos[0],start_pos[1]+N]))) :
-        if N==0:
-            imp_data['raw_names']=dat.iloc[start_pos[0]+1:start_pos[0]+9,start_pos[1]].values.tolist()
-            N=N+1
-        else:
-            imp_data[str(int(dat.iloc[start_pos[0],start_pos[1]+N]))]=dat.iloc[start_pos[0]+1:start_pos[0]+9,start_pos[1]+N].values.tolist()
-            N=N+1
-    imp_data.set_index('raw_names',inplace=True)
+    if markers is None:
+        markers=build_marker_index(dat)
+    start_pos=marker_position(markers, '<>')
+    imp_data=extract_plate_table(dat, start_pos)
     """data output in the DataFrame format"""
     return(imp_data)
 
+def extract_all_meas_res(Fpath_tekan=None, sheets=None):
+    """
+    The function implemented for multi-plate TEKAN workbooks: every measurement table <> of every sheet is extracted.
+    The workbook is read once and every sheet is scanned once for the markers.
+    Function input:
+    Fpath_tekan - filepath to the TEKAN output xlsx measurement file
+    sheets - dictionary sheet name -> DataFrame already parsed from the workbook (if given, the file is not read again)
+    """
+    if sheets is None:
+        sheets = pd.read_excel(Fpath_tekan, sheet_name=None)
+    plates = []
+    for sheet_name, dat in sheets.items():
+        markers = build_marker_index(dat, tokens=['<>'])
+        for n, start_pos in enumerate(markers.get('<>', [])):
+            plate_id = str(sheet_name) + '_' + str(n + 1)
+            plates.append((plate_id, extract_plate_table(dat, start_pos, '<>', sheet_name)))
+    """returns list of tuples (plate_id, DataFrame with initial measurement results) in the workbook order"""
+    return(plates)
+
 
-def extract_data_map(dat):
+def extract_data_map(dat, markers=None):
     """
     The function implemented for a multiwell plate map extracting from the data parsed from a xlsx-config file.
+    Plate format (96, 384 or 1536 wells) is detected from the marked table.
+    markers - marker index of dat (optional)
     """
-    pos_1=dat[dat=='<_>'].stack().index.tolist()
-    start_pos1=(pos_1[0][0],dat.columns.get_loc(pos_1[0][1]))
-    imp_data_map=pd.DataFrame()
+    if markers is None:
+        markers=build_marker_index(dat)
+    start_pos1=marker_position(markers, '<_>')
     """
     Building of map table <_> from full workshit table
     """
-    N=0
-    while ((N<13) and ((start_pos1[1]+N) < (dat.shape[1]))) and (not(pd.isna(dat.iloc[start_pos1[0],start_pos1[1]+N]))):
-        if N==0:
-            imp_data_map['raw_names']=dat.iloc[start_pos1[0]+1:start_pos1[0]+9,start_pos1[1]].values.tolist()
-            N=N+1
-        else:
-            imp_data_map[str(int(dat.iloc[start_pos1[0],start_pos1[1]+N]))]= \
-                                 dat.iloc[start_pos1[0]+1:start_pos1[0]+9, start_pos1[1]+N].values.tolist()
-            N=N+1
-            
-    imp_data_map.set_index('raw_names',inplace=True)
+    imp_data_map=extract_plate_table(dat, start_pos1, '<_>')
         
-    imp_columns_map=list(imp_data_map.columns.values)
     """ 
     Replace NaN from empty cell by valu=Empty
     """
     imp_data_map=imp_data_map.fillna(value='Empty')
     """
-    Copy of the string in which all case-based characters have been lowercased
-    """
-    regularizer = lambda x: x.lower()
+    All labels of the plate normalized at once (lowercase, without spaces and non-alphanumeric characters)
     """
-    Remove spaces before word, and maybe after word?
-    """
-    ss_sub = lambda x: re.sub(r'[^\w]', '', x)
-    """
-    Copy of the string in which the occurrences of old have been replaced with new
-    """
-    sp_replacer = lambda x: x.replace(' ','')
-        
-    for name in imp_columns_map:
-        imp_data_map[name]=imp_data_map[name].apply(ss_sub)
-        imp_data_map[name]=imp_data_map[name].apply(regularizer)
-        imp_data_map[name]=imp_data_map[name].apply(sp_replacer)
+    normalized=normalize_labels(imp_data_map.values.ravel()).values
+    imp_data_map=pd.DataFrame(normalized.reshape(imp_data_map.shape), index=imp_data_map.index,
+                              columns=imp_data_map.columns)
     """
     Returns a multiwell plate map in the DataFrame format
     """
     return(imp_data_map)
 
+def data_map_bad_labels(imp_data_map):
+    """The function implemented to list the multiwell plate map labels which differ from the standard std and sam notations.
+    Function input:
+    imp_data_map - DataFrame with multiwell plate map
+    """
+    remove_digits = str.maketrans('', '', digits)
+    bad_labels = set()
+    for label in set(imp_data_map.stack()):
+        if label.translate(remove_digits) not in ('sam', 'std'):
+            bad_labels.add(label)
+    """returns the sorted list of wrong labels"""
+    return(sorted(bad_labels))
+
 def data_map_check(imp_data_map):
     """The function implemented for multiwell plate map validation.
     Function input:
     imp_data_map - DataFrame with multiwell plate map
     """
-    imp_columns_map=list(imp_data_map.columns.values)
-    remove_digits = str.maketrans('', '', digits)
-    translator= lambda x: x.translate(remove_digits)
-    ret=False
-    for name in imp_columns_map:
-        g_check=imp_data_map[name].apply(translator)
-        
-        for ii in g_check:
-            if (ii=='sam')or(ii=='std'):
-                continue
-            else:
-                ret=True
-                
+    ret = len(data_map_bad_labels(imp_data_map)) > 0
     """returns TRUE if bad data were given (e.g. there are names which differ from the standard std and sam notations)"""
     return(ret)
             
         
-def extract_data_standards(dat_config):
+def extract_data_standards(dat_config, imp_data_map=None, markers=None):
     """
     The function implemented to extract and process mean values of calibration standards.
+    Function input:
+    dat_config - DataFrame parsed from excel_config file
+    imp_data_map - multiwell plate map already extracted from dat_config (optional)
+    markers - marker index of dat_config (optional)
     """
     epsilon = 0.0001
     """
     Workeround to avoid zero value in Std concentration, it should not be exist, but user ...
     """
     #counting of the postulated standards
-    imp_data_map=extract_data_map(dat=dat_config)
-    g1=imp_data_map.stack()
-    g2=set(g1)
-    N_of_std=0
-    for val in g2:
-        if ("std" in val):
-            N_of_std=N_of_std+1
-            continue
-        else:
-            continue
+    if markers is None:
+        markers=build_marker_index(dat_config)
+    if imp_data_map is None:
+        imp_data_map=extract_data_map(dat=dat_config, markers=markers)
+    codes, labels=label_codes(imp_data_map)
+    N_of_std=len([val for val in labels if "std" in val])
     print("Number of standards=" + str(N_of_std))
     
     #extracting and processing calibration standards values
-    pos_2=dat_config[dat_config=='<|>'].stack().index.tolist()
-    start_pos2=(pos_2[0][0],dat_config.columns.get_loc(pos_2[0][1]))
+    start_pos2=marker_position(markers, '<|>')
 
     data_standards=pd.DataFrame()
-    regularizer = lambda x: x.lower()
-    sp_replacer = lambda x: x.replace(' ','')
     
     N=1
     std_list=[]
@@ -234,8 +382,7 @@ def extract_data_standards(dat_config):
     """
     data_standards["std_names"]=std_list
     data_standards["values"]=dat_config.iloc[start_pos2[0]+1:start_pos2[0]+N,start_pos2[1]+1].values.tolist()
-    data_standards["std_names"]=data_standards["std_names"].apply(regularizer)
-    data_standards["std_names"]=data_standards["std_names"].apply(sp_replacer)
+    data_standards["std_names"]=normalize_labels(data_standards["std_names"]).values
     data_standards.set_index('std_names',inplace=True)
 
     print("data_standards: ", data_standards)   
@@ -247,20 +394,19 @@ def extract_data_standards(dat_config):
     """
     return(data_standards)
 
-def extract_specification(dat):
+def extract_specification(dat, markers=None):
     """
     The function implemented to extract sample specification from the parsed excel_config file.
     Function input:
     dat - DataFrame parsed from excel_config file
+    markers - marker index of dat (optional)
     """
-    pos_1=dat[dat=='<||>'].stack().index.tolist()
-    start_pos1=(pos_1[0][0]+1,dat.columns.get_loc(pos_1[0][1]))
+    if markers is None:
+        markers=build_marker_index(dat)
+    pos_1=marker_position(markers, '<||>')
+    start_pos1=(pos_1[0]+1,pos_1[1])
     imp_data_spec=pd.DataFrame()
     
-    regularizer = lambda x: x.lower()
-    ss_sub = lambda x: re.sub(r'[^\w]', '', x)
-    sp_replacer = lambda x: x.replace(' ','')
-    
     abbr=[]
     descr=[]
     
@@ -272,10 +418,7 @@ def extract_specification(dat):
         
         N=N+1
         
-    imp_data_spec['Abbr']=abbr
-    imp_data_spec['Abbr']=imp_data_spec['Abbr'].apply(ss_sub)
-    imp_data_spec['Abbr']=imp_data_spec['Abbr'].apply(regularizer)
-    imp_data_spec['Abbr']=imp_data_spec['Abbr'].apply(sp_replacer)
+    imp_data_spec['Abbr']=normalize_labels(abbr).values
     imp_data_spec['Description']=descr
     imp_data_spec.sort_values(by=['Abbr'])
     """
@@ -283,58 +426,193 @@ def extract_specification(dat):
     """
     return (imp_data_spec)
         
-def get_full_specification(Fpath_config):
+def get_full_specification(Fpath_config=None, dat=None, data_map=None, markers=None, well_index=None):
     """The function implemented to extend sample specification (e.g. with the samples positions).
     Fpath_config - filepath to some excel_config file filled by the laboratory assistant
-    """
-    extr_data = pd.read_excel(Fpath_config)
-    spec_short = extract_specification(dat=extr_data)  
-    dat = pd.read_excel(Fpath_config)
-    data_map = extract_data_map(dat=dat)
+    dat - DataFrame already parsed from the excel_config file (if given, the file is not read again)
+    data_map - multiwell plate map already extracted from dat (optional)
+    markers - marker index of dat (optional)
+    well_index - inverted index of data_map built with build_well_index (optional)
+    """
+    if dat is None:
+        dat = pd.read_excel(Fpath_config)
+    if markers is None:
+        markers = build_marker_index(dat)
+    spec_short = extract_specification(dat=dat, markers=markers)
+    if data_map is None:
+        data_map = extract_data_map(dat=dat, markers=markers)
+    if well_index is None:
+        well_index = build_well_index(data_map)
     
     spec_full=spec_short.fillna("-")
-    
-    N=0
-    
-    positions=[]
-    while N<len(spec_short.iloc[:,0]):
-        position=data_map[data_map==spec_short.iloc[N,0]].stack().index.tolist()
-        
-        lp=len(position)
-        p_n=0
-        position_wr=[]
-        
-        while p_n<lp:
-            position_wr.append("-".join(position[p_n]))
-            p_n=p_n+1
-            
-        position_wr= ", ".join(position_wr)
-        
-        positions.append(position_wr)
-        N=N+1
-    spec_full['Position']=positions
+    spec_full['Position']=[", ".join(well_positions(well_index, data_map, abbr)) for abbr in spec_short['Abbr']]
     """returns DataFrame with extended specification"""
     return(spec_full)
     
 
+class WorkbookSession(object):
+    """
+    The class implemented to parse the TEKAN raw data xlsx-file and the excel_config file only once per run.
+    Every extractor receives the same in-memory DataFrame, the workbooks are read on the first request.
+    Class input:
+    Fpath_tekan, Fpath_config - filepaths to raw data from TEKAN measuremnt system and excel_config file respectively
+    """
+    def __init__(self, Fpath_tekan=None, Fpath_config=None):
+        self.Fpath_tekan = Fpath_tekan
+        self.Fpath_config = Fpath_config
+        self._tekan_sheets = None
+        self._dat_config = None
+        self._tekan_markers = None
+        self._config_markers = None
+        self._data_map = None
+        self._well_index = None
+
+    @property
+    def tekan_sheets(self):
+        """all sheets of the TEKAN output measurement file (sheet name -> DataFrame)"""
+        if self._tekan_sheets is None:
+            self._tekan_sheets = pd.read_excel(self.Fpath_tekan, sheet_name=None)
+        return self._tekan_sheets
+
+    @property
+    def dat_tekan(self):
+        """DataFrame parsed from the first sheet of the TEKAN output measurement file"""
+        return next(iter(self.tekan_sheets.values()))
+
+    @property
+    def dat_config(self):
+        """DataFrame parsed from the excel_config file"""
+        if self._dat_config is None:
+            self._dat_config = pd.read_excel(self.Fpath_config)
+        return self._dat_config
+
+    @property
+    def tekan_markers(self):
+        """marker index of the TEKAN sheet, built in one scan"""
+        if self._tekan_markers is None:
+            self._tekan_markers = build_marker_index(self.dat_tekan)
+        return self._tekan_markers
+
+    @property
+    def config_markers(self):
+        """marker index of the excel_config sheet, built in one scan"""
+        if self._config_markers is None:
+            self._config_markers = build_marker_index(self.dat_config)
+        return self._config_markers
+
+    def meas_res(self):
+        """returns a DataFrame with initial measurement results"""
+        return extract_meas_res(dat=self.dat_tekan, markers=self.tekan_markers)
+
+    def all_meas_res(self):
+        """returns list of tuples (plate_id, DataFrame) with every plate of the TEKAN workbook"""
+        return extract_all_meas_res(sheets=self.tekan_sheets)
+
+    def data_map(self):
+        """returns the multiwell plate map, extracted once per session"""
+        if self._data_map is None:
+            self._data_map = extract_data_map(dat=self.dat_config, markers=self.config_markers)
+        return self._data_map
+
+    def well_index(self):
+        """returns the inverted index of the multiwell plate map, built once per session"""
+        if self._well_index is None:
+            self._well_index = build_well_index(self.data_map())
+        return self._well_index
+
+    def data_standards(self):
+        """returns calibration standards DataFrame"""
+        return extract_data_standards(dat_config=self.dat_config, imp_data_map=self.data_map(),
+                                      markers=self.config_markers)
+
+    def pdf_legend(self):
+        """returns experiment information in the dictionary format"""
+        return extract_pdf_legend(dat=self.dat_config, markers=self.config_markers)
+
+    def specification(self):
+        """returns DataFrame with the short samples specification"""
+        return extract_specification(dat=self.dat_config, markers=self.config_markers)
+
+    def full_specification(self):
+        """returns DataFrame with the specification extended by the samples positions"""
+        return get_full_specification(dat=self.dat_config, data_map=self.data_map(),
+                                      markers=self.config_markers, well_index=self.well_index())
+
+
 def check_function(Fpath_tekan, Fpath_config):
     """
     The function implemented for "parse and check" button.
     Function input:
     Fpath_tekan, Fpath_config - filepaths to raw data from TEKAN measuremnt system and excel_config file respectively
     """
+    session=WorkbookSession(Fpath_tekan=Fpath_tekan, Fpath_config=Fpath_config)
     text_output="Appropriate data set"
-    control_1=tekan_data_check(filepath=Fpath_tekan)
+    control_1=tekan_data_check(filepath=Fpath_tekan, markers=session.tekan_markers)
     if control_1 is True:
         text_output="Initial data was not marked. Inappropriate data style or file format." 
     else:
-        control_2=config_data_check_0(filepath=Fpath_config)
+        control_2=config_data_check_0(filepath=Fpath_config, markers=session.config_markers)
         if control_2 is True:
             text_output=text_output="Data presented in xlsx-config file was not marked. Inappropriate xlsx-configurational data style or file format."
         else:
-            control_3=config_data_check_1(filepath=Fpath_config)
+            control_3=config_data_check_1(filepath=Fpath_config, markers=session.config_markers)
             if control_3 is True:
                 text_output=text_output="Configurational template for footers and headers is absent or has inappropriate form."
     """returns text output for the info field of GUI"""        
     return(text_output)
-    
\ No newline at end of file
+
+def validate_pair(pair):
+    """
+    The function implemented to collect all of the problems of one (TEKAN, config) pair from a single parse of each file.
+    In contrast to check_function the first failure does not stop the remaining checks.
+    Function input:
+    pair - tuple (Fpath_tekan, Fpath_config)
+    """
+    Fpath_tekan, Fpath_config = pair
+    report = {'tekan': Fpath_tekan, 'config': Fpath_config, 'file_errors': [],
+              'missing_markers': [], 'bad_map_labels': [], 'missing_legend_keys': []}
+    session = WorkbookSession(Fpath_tekan=Fpath_tekan, Fpath_config=Fpath_config)
+
+    for role, path, required in (('tekan', Fpath_tekan, ['<>']), ('config', Fpath_config, ['<||>', '<_>', '<|>'])):
+        if not path.endswith('.xlsx'):
+            report['file_errors'].append(path + ': not a xlsx-file')
+            continue
+        try:
+            markers = getattr(session, role + '_markers')
+        except Exception as exc:
+            report['file_errors'].append(path + ': ' + str(exc))
+            continue
+        report['missing_markers'].extend([path + ': ' + m for m in required if m not in markers])
+        if role == 'config':
+            report['missing_legend_keys'] = [nam for nam in PDF_LEGEND_KEYS if nam not in markers]
+            if '<_>' in markers:
+                try:
+                    report['bad_map_labels'] = data_map_bad_labels(session.data_map())
+                except Exception as exc:
+                    report['file_errors'].append(path + ': multiwell plate map - ' + str(exc))
+
+    report['valid'] = not (report['file_errors'] or report['missing_markers'] or
+                           report['bad_map_labels'] or report['missing_legend_keys'])
+    """returns the dictionary with the lists of the detected problems"""
+    return(report)
+
+def batch_check_function(pairs, processes=None):
+    """
+    The function implemented to pre-check a whole batch of plates before any calculation starts.
+    Every file is parsed only once and the pairs are validated over a process pool.
+    Function input:
+    pairs - list of tuples (Fpath_tekan, Fpath_config)
+    processes - number of worker processes (None - number of CPU cores, 1 - serial run)
+    """
+    pairs = [tuple(pair) for pair in pairs]
+    if processes == 1 or len(pairs) < 2:
+        reports = [validate_pair(pair) for pair in pairs]
+    else:
+        pool = Pool(processes=processes)
+        try:
+            reports = pool.map(validate_pair, pairs)
+        finally:
+            pool.close()
+            pool.join()
+    """returns the list of reports in the order of the given pairs"""
+    return(reports)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Created on October 2026
+@author:  Marek Bawiec, Grzegorz Banach
+The ELISA tool plugin: module containing compact array representation of a measured multiwell plate.
+"""
+
+__author__ = "Marek Bawiec, Grzegorz Banach"
+__copyright__ = "Copyright 2019, Physiolution Polska"
+__credits__ = [""]
+__license__ = "GPL"
+__version__ = "0.0.1"
+__maintainer__ = "Grzegorz Banach"
+__email__ = "g.banach@physiolution.pl"
+__status__ = "Production"
+
+import numpy as np
+import pandas as pd
+import elisa_tool_repo.et_parse_func as epf
+
+
+class Plate(object):
+    """
+    The class implemented to keep one measured plate as flat arrays instead of DataFrames of lists.
+    Wells are numbered row-major (well = row*number_of_columns + column), as in et_parse_func.build_well_index.
+    Class input:
+    absorbance - 1-D float array of the measurement results (one value per well)
+    codes - 1-D integer array of the label codes (one code per well, index to labels)
+    labels - array with the label table (code -> normalized label, sorted)
+    shape - (number_of_rows, number_of_columns) of the plate
+    row_names, col_names - names of the rows and columns of the plate (e.g. A..H and 1..12)
+    plate_id - name of the plate in multi-plate TEKAN workbooks
+    well_index - inverted index of the plate map (optional, built on first use)
+    The replicates statistics (replicate_stats) are calculated once per plate and shared by all of the consumers
+    (data_st_to_print, data_std_format, recognition_experiment, samples_concenration), so the absorbances and codes
+    should not be changed after the first call.
+    """
+    __slots__ = ('absorbance', 'codes', 'labels', 'shape', 'row_names', 'col_names', 'plate_id', '_well_index', '_replicates')
+
+    def __init__(self, absorbance, codes, labels, shape, row_names=None, col_names=None, plate_id=None, well_index=None):
+        self.absorbance = np.asarray(absorbance, dtype='float64').ravel()
+        self.codes = np.asarray(codes, dtype='intp').ravel()
+        self.labels = np.asarray(labels, dtype=object)
+        self.shape = tuple(shape)
+        self.row_names = row_names
+        self.col_names = col_names
+        self.plate_id = plate_id
+        self._well_index = well_index
+        self._replicates = None
+
+    @classmethod
+    def from_frames(cls, meas_res, data_map, plate_id=None, well_index=None):
+        """
+        The function implemented to build the plate from the outputs of extract_meas_res and extract_data_map.
+        The measurement results are aligned to the plate map by the row and column names.
+        """
+        codes, labels = epf.label_codes(data_map)
+        absorbance = meas_res.loc[data_map.index, data_map.columns].values
+        return cls(absorbance=absorbance, codes=codes, labels=labels, shape=data_map.shape,
+                   row_names=list(data_map.index), col_names=list(data_map.columns), plate_id=plate_id,
+                   well_index=well_index)
+
+    def __len__(self):
+        return len(self.absorbance)
+
+    def __repr__(self):
+        return "Plate(%s, %dx%d wells, %d labels)" % (self.plate_id, self.shape[0], self.shape[1], len(self.labels))
+
+    def well_index(self):
+        """returns dictionary: label -> array of well numbers (built once per plate)"""
+        if self._well_index is None:
+            self._well_index = epf.codes_to_well_index(self.codes, list(self.labels))
+        return self._well_index
+
+    def wells(self, label):
+        """returns array of well numbers with the given label"""
+        return self.well_index().get(label, np.array([], dtype='intp'))
+
+    def values(self, label):
+        """returns absorbances of all of the replicates of the given label"""
+        return self.absorbance[self.wells(label)]
+
+    def replicate_stats(self):
+        """
+        The function implemented to calculate number, mean and standard deviation (ddof=0, as numpy.std) of the replicates
+        of all of the labels at once, grouping the wells by the label codes with numpy.bincount.
+        The result is memoized (read-only arrays) and the same tuple is returned to every caller.
+        """
+        if self._replicates is None:
+            n_labels = len(self.labels)
+            counts = np.bincount(self.codes, minlength=n_labels)
+            means = np.bincount(self.codes, weights=self.absorbance, minlength=n_labels) / counts
+            squares = np.bincount(self.codes, weights=(self.absorbance - means[self.codes])**2, minlength=n_labels)
+            stds = np.sqrt(squares / counts)
+            for arr in (counts, means, stds):
+                arr.flags.writeable = False
+            self._replicates = (counts, means, stds)
+        """returns tuple of three arrays indexed by the label code: (counts, means, stds)"""
+        return self._replicates
+
+    def codes_by_position(self):
+        """returns label codes ordered by their first well on the plate (row by row)"""
+        codes, first = np.unique(self.codes, return_index=True)
+        return codes[np.argsort(first, kind='mergesort')]
+
+    def labels_by_position(self):
+        """returns labels ordered by their first well on the plate (row by row)"""
+        return [self.labels[c] for c in self.codes_by_position()]
+
+    def to_frame(self):
+        """returns DataFrame with the measurement results in the plate layout"""
+        return pd.DataFrame(self.absorbance.reshape(self.shape), index=self.row_names, columns=self.col_names)
@@ -15,7 +15,6 @@ __maintainer__ = "Grzegorz Banach"
 __email__ = "g.banach@physiolution.pl"
 __status__ = "Production"
 
-import matplotlib.pyplot as plt
 
 def draw_and_save_plot(X_fun, Y_fun, X_std, Y_std, X_sam, Y_sam, title_string, order, X_sb_err, X_su_err, Y_s_err, Y_std_err):
     """
@@ -24,6 +23,7 @@ def draw_and_save_plot(X_fun, Y_fun, X_std, Y_std, X_sam, Y_sam, title_string, o
     X_std, Y_std - calibration standards data points
     X_sam, Y_sam - sample measurement points
     """
+    import matplotlib.pyplot as plt
     Fpath= 'calc_results_common_' + order + '.png'
 
     #plt.figure(figsize=(7,4), dpi=150)
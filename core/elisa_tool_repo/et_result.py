@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Created on October 2026
+@author:  Marek Bawiec, Grzegorz Banach
+The ELISA tool plugin: module containing the result of a calibration curve fit.
+"""
+
+__author__ = "Marek Bawiec, Grzegorz Banach"
+__copyright__ = "Copyright 2019, Physiolution Polska"
+__credits__ = [""]
+__license__ = "GPL"
+__version__ = "0.0.1"
+__maintainer__ = "Grzegorz Banach"
+__email__ = "g.banach@physiolution.pl"
+__status__ = "Production"
+
+import numpy as np
+import elisa_tool_repo.et_optim as eto
+
+"""
+Scalar fields of FitResult stored in the flat array (to_array) after the model parameters, missing values are NaN
+"""
+ARRAY_FIELDS = ('rss', 'r_squ', 'aic', 'bic', 'r_corre', 'error', 'calc_time', 'de_popsize', 'de_maxiter', 'generations')
+
+
+class FitResult(object):
+    """
+    The class implemented to keep the result of one calibration curve fit in fixed fields.
+    For the older code it still behaves as the list of tuples (name, value) returned by the fitting functions before:
+    [('A_par1', ..), .., ('RSS', ..), ('R_squ', ..), ('AIC_crit', ..), ('BIC_crit', ..), ('R_corre', ..), ('Error', ..)]
+    followed by the search budget (DE_popsize, DE_maxiter, Generations) and the auto mode entries (Auto_order, Auto_ranking)
+    when they are set, so param[0][1], dict(param)['Error'] and iteration keep working.
+    Class input:
+    model - model family: LN, 4PL or 5PL (parameters in the order of et_optim.MODELS)
+    params - 1-D array of the model parameters
+    rss - mean residual sum of squares (RSS/number of standards)
+    r_squ, aic, bic, r_corre - goodness of fit (et_optim.fit_metrics)
+    error - error flag (1 - parameter at the range limit, too large RSS or too small R^2)
+    covariance - covariance matrix of the parameters (None if unknown)
+    calc_time - time of the fit [s] (None if unknown)
+    de_popsize, de_maxiter, generations - search budget of the differential evolution fits (None for the local fits)
+    auto_order, auto_ranking - order chosen by the auto mode and the ranking of the candidates (None otherwise)
+    """
+    __slots__ = ('model', 'names', 'params', 'rss', 'r_squ', 'aic', 'bic', 'r_corre', 'error', 'covariance', 'calc_time',
+                 'de_popsize', 'de_maxiter', 'generations', 'auto_order', 'auto_ranking')
+
+    def __init__(self, model, params, rss=np.nan, r_squ=np.nan, aic=np.nan, bic=np.nan, r_corre=np.nan, error=0,
+                 covariance=None, calc_time=None, de_popsize=None, de_maxiter=None, generations=None,
+                 auto_order=None, auto_ranking=None):
+        self.model = model
+        self.names = eto.MODELS[model][0]
+        self.params = np.asarray(params, dtype='float64')
+        self.rss = rss
+        self.r_squ = r_squ
+        self.aic = aic
+        self.bic = bic
+        self.r_corre = r_corre
+        self.error = int(error)
+        self.covariance = covariance
+        self.calc_time = calc_time
+        self.de_popsize = de_popsize
+        self.de_maxiter = de_maxiter
+        self.generations = generations
+        self.auto_order = auto_order
+        self.auto_ranking = auto_ranking
+
+    @classmethod
+    def batch(cls, model, P, rss, r_squ, aic, bic, r_corre, error, covariance=None):
+        """returns list of FitResult, one for every row of the parameters array P, of the metrics arrays and of the covariances"""
+        return [cls(model, P[k], rss[k], r_squ[k], aic[k], bic[k], r_corre[k], error[k],
+                    None if covariance is None else covariance[k]) for k in range(len(P))]
+
+    @classmethod
+    def from_items(cls, parameters, model):
+        """
+        The function implemented to build the result from the list of tuples (name, value) of the older fitting functions.
+        """
+        values = dict(parameters)
+        names = eto.MODELS[model][0]
+        return cls(model, [values[n + '_par1'] for n in names], rss=values.get('RSS', np.nan),
+                   r_squ=values.get('R_squ', np.nan), aic=values.get('AIC_crit', np.nan), bic=values.get('BIC_crit', np.nan),
+                   r_corre=values.get('R_corre', np.nan), error=values.get('Error', 0),
+                   de_popsize=values.get('DE_popsize'), de_maxiter=values.get('DE_maxiter'), generations=values.get('Generations'),
+                   auto_order=values.get('Auto_order'), auto_ranking=values.get('Auto_ranking'))
+
+    @classmethod
+    def of(cls, parameters, model):
+        """returns parameters if it is a FitResult already, otherwise the FitResult built from the list of tuples"""
+        if isinstance(parameters, cls):
+            return parameters
+        return cls.from_items(parameters, model)
+
+    @classmethod
+    def from_array(cls, values, model):
+        """
+        The function implemented to rebuild the result stored with to_array (the auto mode fields are not stored).
+        """
+        values = np.asarray(values, dtype='float64')
+        n_par = len(eto.MODELS[model][0])
+        fields = dict(zip(ARRAY_FIELDS, values[n_par:n_par + len(ARRAY_FIELDS)]))
+        for name in ('calc_time', 'de_popsize', 'de_maxiter', 'generations'):
+            if np.isnan(fields[name]):
+                fields[name] = None
+        for name in ('de_popsize', 'de_maxiter', 'generations'):
+            if fields[name] is not None:
+                fields[name] = int(fields[name])
+        covariance = values[n_par + len(ARRAY_FIELDS):].reshape(n_par, n_par)
+        if np.all(np.isnan(covariance)):
+            covariance = None
+        return cls(model, values[:n_par], covariance=covariance, **fields)
+
+    def to_array(self):
+        """
+        returns flat float array: the parameters, ARRAY_FIELDS and the covariance matrix (row by row), missing values are NaN
+        """
+        n_par = len(self.names)
+        scalars = [np.nan if getattr(self, name) is None else getattr(self, name) for name in ARRAY_FIELDS]
+        if self.covariance is None:
+            covariance = np.full(n_par*n_par, np.nan)
+        else:
+            covariance = np.asarray(self.covariance, dtype='float64').ravel()
+        return np.concatenate([self.params, np.array(scalars, dtype='float64'), covariance])
+
+    def param(self, name):
+        """returns value of the model parameter (A, B, C, D or E)"""
+        return self.params[self.names.index(name)]
+
+    def items(self):
+        """returns list of tuples (name, value) in the layout of the older fitting functions"""
+        items = [(name + '_par1', self.params[k]) for k, name in enumerate(self.names)]
+        items.extend([('RSS', self.rss), ('R_squ', self.r_squ), ('AIC_crit', self.aic), ('BIC_crit', self.bic),
+                      ('R_corre', self.r_corre), ('Error', self.error)])
+        if self.de_popsize is not None:
+            items.extend([('DE_popsize', self.de_popsize), ('DE_maxiter', self.de_maxiter), ('Generations', self.generations)])
+        if self.auto_order is not None:
+            items.extend([('Auto_order', self.auto_order), ('Auto_ranking', self.auto_ranking)])
+        return items
+
+    def __iter__(self):
+        return iter(self.items())
+
+    def __getitem__(self, k):
+        return self.items()[k]
+
+    def __len__(self):
+        return len(self.items())
+
+    def __repr__(self):
+        return "FitResult(%s, %s, RSS=%g, Error=%d)" % (
+            self.model, ', '.join('%s=%g' % (n, v) for n, v in zip(self.names, self.params)), self.rss, self.error)
@@ -17,114 +17,275 @@ __email__ = "g.banach@physiolution.pl"
 __status__ = "Production"
 
 #import sys
+import time
+from multiprocessing import Pool
 import pandas as pd
+import elisa_tool_repo.et_boot as etb
 import elisa_tool_repo.et_calc as ecf
 import elisa_tool_repo.et_parse_func as epf
+import elisa_tool_repo.et_plate as etp
 import elisa_tool_repo.et_plot_func as edpf
 import elisa_tool_repo.pdf_creator as pdf
 
-def parse_input_data(Fpath_tekan, Fpath_config):
+def parse_workbooks(Fpath_tekan, Fpath_config, cache=None):
     """
-    The function used to parse, collect and process data for ln-model report generation.
-    Function inputs Fpath_tekan and Fpath_config should contain filepaths to TEKAN raw data xlsx-file and standard xlsx config file respectively.
+    The function used to extract all of the tables from the TEKAN raw data xlsx-file and the standard xlsx config file.
+    If cache (et_cache.PlateCache) is given, a plate parsed before with the same files content is loaded without Excel parsing.
     """
+    if cache is not None:
+        key = cache.key(Fpath_tekan, Fpath_config)
+        parsed = cache.load(key)
+        if parsed is not None:
+            parsed['well_index'] = epf.build_well_index(parsed['data_map'])
+            return parsed
 
-    dat = pd.read_excel(Fpath_tekan)
-    meas_res = epf.extract_meas_res(dat=dat)
+    session = epf.WorkbookSession(Fpath_tekan=Fpath_tekan, Fpath_config=Fpath_config)
     """
-    means_res: read measurement table <> as DataFrame from tekan xls file, returns a DataFrame with initial measurement results
+    session: TEKAN and config xlsx files are parsed only once, all of the extractors below share the same DataFrames
     """
-
-    dat = pd.read_excel(Fpath_config)
-    data_map = epf.extract_data_map(dat=dat)
+    parsed = {}
+    parsed['plates'] = session.all_meas_res()
+    """
+    plates: read every measurement table <> from all sheets of tekan xls file, returns list of (plate_id, DataFrame with initial measurement results)
+    """
+    if not parsed['plates']:
+        raise ValueError("Measurement table <> was not found in " + str(Fpath_tekan))
+    parsed['meas_res'] = parsed['plates'][0][1]
+    """
+    means_res: the first measurement table <> (single-plate runs)
+    """
+    parsed['data_map'] = session.data_map()
     """
     data_map: read mapping table <_> as DataFrame from config xls file, returns a DataFrame with multiwell plate map
     """
-
-    dat = pd.read_excel(Fpath_config)
-    data_standards = epf.extract_data_standards(dat_config=dat)
+    parsed['well_index'] = session.well_index()
+    """
+    well_index: inverted index of the plate map (label -> wells), shared by all of the plates of the run
+    """
+    parsed['data_standards'] = session.data_standards()
     """
     data_standards: reduce number of std and read std concentration table <|> as DataFrame from config xls file:
     df include (std_name, concentration), returns calibration standards DataFrame from the excel_config file filled by the laboratory assistant
     """
+    parsed['pdf_leg'] = session.pdf_legend()
+    """
+    pdf_leg: experiment information extracting from config xls file as dictionary for final pdf report;
+    """
+    parsed['specification'] = session.full_specification()
+    """
+    specification: extend sample specification (e.g. with the samples positions in the plate)
+    """
+    if cache is not None:
+        cache.store(key, parsed)
+    return parsed
 
-    data_standards_for_rep = ecf.data_st_to_print(imp_data=meas_res, imp_data_map=data_map, data_standards=data_standards)
+def parse_input_data(Fpath_tekan, Fpath_config, cache=None):
     """
-    data_standards_for_rep: generate DataFrame(result) of data calibration standard
-    result["name"]=sample
-    result["conc"]=X_st
-    result["absorbance"]=Y_st, abs_ave
+    The function used to parse, collect and process data for ln-model report generation.
+    Function inputs Fpath_tekan and Fpath_config should contain filepaths to TEKAN raw data xlsx-file and standard xlsx config file respectively.
+    Function input cache (optional et_cache.PlateCache) lets re-runs on the same files skip Excel parsing.
     """
+    parsed = parse_workbooks(Fpath_tekan=Fpath_tekan, Fpath_config=Fpath_config, cache=cache)
+    return plate_input_data(meas_res=parsed['meas_res'], parsed=parsed)
 
-    pdf_leg = epf.extract_pdf_legend(Fpath_config)
+def parse_input_plates(Fpath_tekan, Fpath_config, cache=None):
     """
-    pdf_leg: experiment information extracting from config xls file as dictionary for final pdf report;
+    The function used to parse multi-plate TEKAN workbooks (several <> tables and/or several sheets) in a single pass.
+    All of the plates share the plate map, standards and legend from the xlsx config file.
     """
+    parsed = parse_workbooks(Fpath_tekan=Fpath_tekan, Fpath_config=Fpath_config, cache=cache)
+    """returns list of tuples (plate_id, output of parse_input_data for the plate)"""
+    return [(plate_id, plate_input_data(meas_res=meas_res, parsed=parsed, plate_id=plate_id)) for plate_id, meas_res in parsed['plates']]
 
-    specification = epf.get_full_specification(Fpath_config)
+def plate_input_data(meas_res, parsed, plate_id=None):
+    """
+    The function used to combine the measurement results of one plate with the tables parsed from the xlsx config file.
+    """
+    data_map = parsed['data_map']
+    data_standards = parsed['data_standards']
+    pdf_leg = parsed['pdf_leg']
+    specification = parsed['specification']
+    plate = etp.Plate.from_frames(meas_res=meas_res, data_map=data_map, plate_id=plate_id, well_index=parsed['well_index'])
+    """
+    plate: measurement results and plate map as flat arrays (et_plate.Plate), used by aggregation, fitting and reporting
+    """
+
+    data_standards_for_rep = ecf.data_st_to_print(imp_data=meas_res, imp_data_map=data_map, data_standards=data_standards,
+                                                  plate=plate)
+    """
+    data_standards_for_rep: generate DataFrame(result) of data calibration standard
+    result["name"]=sample
+    result["conc"]=X_st
+    result["absorbance"]=Y_st, abs_ave
     """
-    specification: extend sample specification (e.g. with the samples positions in the plate)
-    """   
 
-    dat_model = ecf.data_std_format(imp_data=meas_res, imp_data_map=data_map, data_standards=data_standards) 
+    dat_model = ecf.data_std_format(imp_data=meas_res, imp_data_map=data_map, data_standards=data_standards,
+                                    plate=plate)
     """
     dat_model: implemented to extract, clean and order calibration standards for further numerical-models fitting. Remove zero value from concentration.
     """   
     
-    return(meas_res, data_map, data_standards, data_standards_for_rep, pdf_leg, specification, dat_model)
+    return(meas_res, data_map, data_standards, data_standards_for_rep, pdf_leg, specification, dat_model, plate)
     #['Y_names', 'Y_abs', 'samples_nb', 'Y_ave_abs', 'Y_abs_std', 'X_concentration', 'X_s_conc_std_bottom', 'X_s_conc_std_upper', 'Errors']
 
-def interpolation_eng(dat_model, order, param_range):
+def fit_model(dat_model, order, param_range, de_options=None, prior=None):
     """
-    The function used to parse, collect and process data for ln-model report generation.
-    Function inputs Fpath_tekan and Fpath_config should contain filepaths to TEKAN raw data xlsx-file and standard xlsx config file respectively.
+    The function used to fit one model order (LN, 4PL, 5PL, cfLN, cf4PL, cf5PL, hLN, h4PL, h5PL) to the calibration standards.
+    Function input prior (accepted parameters of the same assay, et_cache.FitStore.prior) is the start point of the fit.
+    returns FitResult with the model parameters and the time of the fit
     """
+    start_time = time.time()
     if order=="LN":
-        par_model=ecf.ln_func_par_opt(D_st=dat_model, start_range=param_range)
+        par_model=ecf.ln_func_par_opt(D_st=dat_model, start_range=param_range, de_options=de_options, prior=prior)
     if order=="4PL":
-        par_model=ecf.logit_4PL_par_opt(D_st=dat_model, start_range=param_range)
+        par_model=ecf.logit_4PL_par_opt(D_st=dat_model, start_range=param_range, de_options=de_options, prior=prior)
     if order=="5PL":
-        par_model=ecf.logit_5PL_par_opt(D_st=dat_model, start_range=param_range) 
+        par_model=ecf.logit_5PL_par_opt(D_st=dat_model, start_range=param_range, de_options=de_options, prior=prior)
     if order=="cfLN":
-        par_model=ecf.LN_func_curve_fit(D_st=dat_model, start_range=param_range)
+        par_model=ecf.LN_func_curve_fit(D_st=dat_model, start_range=param_range, prior=prior)
     if order=="cf4PL":
-        par_model=ecf.logit_4PL_curve_fit(D_st=dat_model, start_range=param_range)        
+        par_model=ecf.logit_4PL_curve_fit(D_st=dat_model, start_range=param_range, prior=prior)
     if order=="cf5PL":
-        par_model=ecf.logit_5PL_curve_fit(D_st=dat_model, start_range=param_range)
+        par_model=ecf.logit_5PL_curve_fit(D_st=dat_model, start_range=param_range, prior=prior)
+    if order in ("hLN", "h4PL", "h5PL"):
+        par_model=ecf.hybrid_par_opt(D_st=dat_model, start_range=param_range, model=ecf.model_family(order), de_options=de_options,
+                                     prior=prior)
+    par_model.calc_time = time.time() - start_time
+    return par_model
+
+def _fit_candidate(job):
+    """pool worker: fits one candidate model of the auto mode"""
+    return fit_model(*job)
+
+def interpolation_eng(dat_model, order, param_range, de_options=None, fit_store=None, legend=None):
+    """
+    The function used to parse, collect and process data for ln-model report generation.
+    Function inputs Fpath_tekan and Fpath_config should contain filepaths to TEKAN raw data xlsx-file and standard xlsx config file respectively.
+    Function input de_options ("DE" section of elisa-tool.conf) sets workers and seed of the differential evolution fits.
+    Function inputs fit_store (et_cache.FitStore) and legend (pdf_leg of the plate) warm-start the fit from the accepted
+    parameters of the same assay and order; the new fit is recorded (or evicts the assay when rejected with Error=1).
+    The order "auto" fits all of the candidate models and returns the best one (see auto_interpolation_eng).
+    """
+    if order=="auto":
+        return auto_interpolation_eng(dat_model=dat_model, auto_range=param_range, de_options=de_options,
+                                      fit_store=fit_store, legend=legend)
+    prior = None
+    if fit_store is not None and legend is not None:
+        store_key = fit_store.key(legend, order)
+        prior = fit_store.prior(store_key)
+    par_model = fit_model(dat_model=dat_model, order=order, param_range=param_range, de_options=de_options, prior=prior)
+    if fit_store is not None and legend is not None:
+        record_fit(fit_store, store_key, order, par_model)
         
     print("@param_range in ENG: ",param_range)
     print("@par_model in ENG: ",par_model)
     return par_model
 
+def record_fit(fit_store, store_key, order, par_model):
+    """
+    The function used to store the accepted model parameters in the warm-start store (Error=1 evicts the assay).
+    """
+    fit_store.record(store_key, par_model.params, par_model.error)
+
+def model_ranking(fits, criterion="AIC"):
+    """
+    The function used to rank the fitted models by the information criterion (AIC or BIC, lower is better);
+    the models with the Error flag are ranked after all of the correct ones.
+    returns list of tuples (order, criterion value, Error flag) from the best model
+    """
+    if criterion == "BIC":
+        ranking = [(order, par_model.bic, par_model.error) for order, par_model in fits]
+    else:
+        ranking = [(order, par_model.aic, par_model.error) for order, par_model in fits]
+    ranking.sort(key=lambda item: (item[2], item[1]))
+    return ranking
+
+def auto_interpolation_eng(dat_model, auto_range, de_options=None, fit_store=None, legend=None):
+    """
+    The function used to fit all of the candidate models to the same calibration standards and to choose the model
+    with the lowest information criterion.
+    Function input auto_range: "auto" section of elisa-tool.conf with
+    candidates - list of the model orders (e.g. hLN, h4PL, h5PL), criterion - AIC or BIC,
+    workers - number of processes fitting the candidates (1 - one after another),
+    ranges - dictionary: order -> parameters ranges of the order.
+    returns FitResult of the best model with auto_order (best order) and auto_ranking (ranking of all of the candidates)
+    """
+    start_time = time.time()
+    candidates = auto_range["candidates"]
+    criterion = auto_range.get("criterion", "AIC")
+    workers = int(auto_range.get("workers", 1))
+    store_keys = {}
+    priors = {}
+    for order in candidates:
+        if fit_store is not None and legend is not None:
+            store_keys[order] = fit_store.key(legend, order)
+            priors[order] = fit_store.prior(store_keys[order])
+    if workers > 1:
+        """pool processes cannot start their own pools, the differential evolution runs in one process"""
+        job_de_options = dict(de_options or {}, workers=1)
+    else:
+        job_de_options = de_options
+    jobs = [(dat_model, order, auto_range["ranges"][order], job_de_options, priors.get(order)) for order in candidates]
+    if workers > 1:
+        pool = Pool(min(workers, len(jobs)))
+        try:
+            par_models = pool.map(_fit_candidate, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        par_models = [_fit_candidate(job) for job in jobs]
+    fits = list(zip(candidates, par_models))
+    for order, par_model in fits:
+        if order in store_keys:
+            record_fit(fit_store, store_keys[order], order, par_model)
+    ranking = model_ranking(fits, criterion)
+    best_order = ranking[0][0]
+    ranking_text = '; '.join('%s %s=%.4f%s' % (order, criterion, value, ' (Error)' if error else '')
+                             for order, value, error in ranking)
+    par_model = dict(fits)[best_order]
+    par_model.auto_order = best_order
+    par_model.auto_ranking = ranking_text
+    par_model.calc_time = time.time() - start_time
+    return par_model
+
+def fitted_order(par_model, order):
+    """returns the model order of the fit (the winner of the auto mode or the given order)"""
+    if par_model.auto_order is not None:
+        return par_model.auto_order
+    return order
+
 """
-output: (meas_res, data_map, data_standards, data_standards_for_rep, pdf_leg, specification, dat_model)
+output: (meas_res, data_map, data_standards, data_standards_for_rep, pdf_leg, specification, dat_model, plate)
 """
 def make_report(std_mat, X_std, Y_std, param, res_folder, r_name, meas_res, data_map, 
                 data_standards, data_standards_for_rep, specification, pdf_leg, licence_notice, 
-                order_model, cal_time):
+                order_model, cal_time, plate=None, bootstrap=None):
     #################################   Tutaj szukaj: data_standards_for_rep vs data_standards
     """
     The function used to generate pdf and csv reports for 5PL model.
     Function inputs Fpath_tekan and Fpath_config should contain filepaths to TEKAN raw data xlsx-file and standard xlsx config file respectively.
     Function input res_folder is used to provide information about destination folder for report generation opertions.
     Function input r_name is used to provide suffix for genrated reports (i.e. first part of the reports name)
+    Function input bootstrap (optional output of bootstrap_eng) adds the bootstrap intervals to the reports.
     """
     # to jest do rozszycia! parsing_sam_and_concenration zawiera parsowanie sam i obliczenia koncentracji (!)  
     result_model = ecf.samples_concenration(imp_data = meas_res, imp_data_map = data_map, params = param,
-                                                ordered = order_model, d_st = data_standards_for_rep)
+                                                ordered = order_model, d_st = data_standards_for_rep, plate = plate)
     # dataframe['Y_names', 'Y_abs', 'samples_nb', 'Y_ave_abs', 'Y_abs_std', 'X_concentration', 'Errors']
     """        
     result_model=ecf.parsing_sam_and_concenration(imp_data=meas_res, imp_data_map=data_map, params=param, ordered=order_model)
-                 0             1               2         3               4                5                 6            7        8          9
-    output: (Y_s_names, X_s_concentration, Y_s_good, Y_s_bad, X_s_conc_std_bottom, X_s_conc_std_upper, Y_s_abs_std, X_std_abs, Y_std_abs, Y_std_std)
+                 0             1               2         3               4                5                 6            7        8          9              10                  11
+    output: (Y_s_names, X_s_concentration, Y_s_good, Y_s_bad, X_s_conc_std_bottom, X_s_conc_std_upper, Y_s_abs_std, X_std_abs, Y_std_abs, Y_std_std,
+             X_s_conc_ci_bottom, X_s_conc_ci_upper)
     """
         
     theor_model_X_axis=ecf.theor_X(res_sam_mat=result_model, std_mat=std_mat)
-    if ((order_model=="LN") or (order_model=="cfLN")):
+    if (ecf.model_family(order_model)=="LN"):
          theor_model_Y_axis=ecf.LN_func(X_data=theor_model_X_axis, param=param)
-    if ((order_model=="4PL") or (order_model=="cf4PL")):
+    if (ecf.model_family(order_model)=="4PL"):
          theor_model_Y_axis=ecf.logit_4PL_func(X_data=theor_model_X_axis, param=param)
-    if ((order_model=="5PL") or (order_model=="cf5PL")):
+    if (ecf.model_family(order_model)=="5PL"):
          theor_model_Y_axis=ecf.logit_5PL_func(X_data=theor_model_X_axis, param=param)
     
     theor_val = ecf.remove_abs_smaller_0(X_data=theor_model_X_axis, Y_data=theor_model_Y_axis)
@@ -141,10 +302,12 @@ def make_report(std_mat, X_std, Y_std, param, res_folder, r_name, meas_res, data
        
     pdf.pdf_report_generation(rep_name=r_name, p_folder=res_folder, plot_name=plot_name, D_samples=result_model, 
                               parameters=param, i_data=meas_res, i_data_map=data_map, d_st=data_standards_for_rep, legend=pdf_leg, 
-                              plot_name1=plot_name1, spec=specification, notice=licence_notice, order=order_model, cal_time=cal_time)
+                              plot_name1=plot_name1, spec=specification, notice=licence_notice, order=order_model, cal_time=cal_time,
+                              bootstrap=bootstrap)
     
     pdf.rep_csv_order(rep_name=r_name, p_folder=res_folder, D_sam=result_model, 
-                      parameters=param, i_data=meas_res, i_data_map=data_map, d_st=data_standards_for_rep, order=order_model, cal_time=cal_time)
+                      parameters=param, i_data=meas_res, i_data_map=data_map, d_st=data_standards_for_rep, order=order_model, cal_time=cal_time,
+                      bootstrap=bootstrap)
 
     """ 
     X_fun=theor_val['X'], Y_fun=theor_val['Y']     - Theor calibration
@@ -156,4 +319,98 @@ def make_report(std_mat, X_std, Y_std, param, res_folder, r_name, meas_res, data
     #result_export = pd.DataFrame(data)
     #return result_export
 
-    return theor_val['X'], theor_val['Y'], X_std, Y_std, result_model[1], result_model[2]
\ No newline at end of file
+    return theor_val['X'], theor_val['Y'], X_std, Y_std, result_model[1], result_model[2]
+
+
+def bootstrap_eng(run_step_1, par_model, order, param_range, boot_options=None):
+    """
+    The function used to run the bootstrap of the fitted calibration curve and of the sample concentrations (et_boot.bootstrap)
+    for the reports. The refits are bounded by the parameters ranges of the order (for the auto mode: of the chosen order).
+    Function input boot_options: "bootstrap" section of elisa-tool.conf (replicates, batch, workers, time_budget_s, seed, percentiles).
+    returns bootstrap summary or None if boot_options is not given or the bootstrap is switched off (replicates = 0, the default),
+    the reports are then generated without the bootstrap rows and columns
+    """
+    if boot_options is None or int(etb.boot_settings(boot_options)['replicates']) <= 0:
+        return None
+    start_range = param_range["ranges"][order] if "ranges" in param_range else param_range
+    bounds = [(start_range[name][0], start_range[name][1]) for name in par_model.names]
+    return etb.bootstrap(plate=run_step_1[7], d_st=run_step_1[3], fit=par_model, bounds=bounds, boot_options=boot_options)
+
+def fit_error_info(par_model):
+    """
+    The function used to translate the Error flag of the fitted model into the message for the error report.
+    Returns None if the calculation finished without errors.
+    """
+    if par_model.error == 0:
+        return None
+    error_info = "Err: too small bound of parameter changes for method, parameter=bound"
+    if par_model.rss > 0.3:
+        error_info = "Err: too small bound of parameter changes for method, RSS error"
+    return error_info
+
+def batch_interpolation_eng(dat_models, order, param_range, fit_store=None, legends=None):
+    """
+    The function used to fit the calibration curves of K plates at once with the batched least squares
+    (ecf.batch_par_opt), the order gives the model family (cfLN, cf4PL, cf5PL use the batched path in batch_report).
+    Function inputs fit_store and legends (pdf_leg of every plate) warm-start and record the fits as in interpolation_eng;
+    every plate is started from the stored parameters of its own assay (template and SOP of its legend).
+    returns list of K FitResult with the model parameters
+    """
+    start_time = time.time()
+    model = ecf.model_family(order)
+    priors = None
+    if fit_store is not None and legends is not None:
+        """plates with the same key share the lookup"""
+        store_keys = [fit_store.key(legend, order) for legend in legends]
+        stored = dict((key, fit_store.prior(key)) for key in set(store_keys))
+        priors = [stored[key] for key in store_keys]
+    par_models = ecf.batch_par_opt(dat_models=dat_models, start_range=param_range, model=model, priors=priors)
+    for par_model in par_models:
+        par_model.calc_time = (time.time() - start_time)/len(par_models)
+    if priors is not None:
+        for store_key, par_model in zip(store_keys, par_models):
+            record_fit(fit_store, store_key, order, par_model)
+    return par_models
+
+def batch_report(plates, order, param_range, res_folder, r_name, licence_notice, de_options=None, fit_store=None,
+                 boot_options=None):
+    """
+    The function used to fit and report a whole collection of plates (output of parse_input_plates) as one batch.
+    Every plate gets its own pdf and csv report (or *error.csv) with the plate_id in the report name.
+    Function input fit_store (optional et_cache.FitStore) warm-starts every fit from the plates of the same assay.
+    The curve_fit orders (cfLN, cf4PL, cf5PL) fit all of the plates at once (batch_interpolation_eng), the calculation time
+    of every plate is then the share of the batch. With the order "auto" every plate is reported with its best model.
+    Function input boot_options ("bootstrap" section of elisa-tool.conf) adds the bootstrap intervals to the reports (bootstrap_eng).
+    """
+    if order in ("cfLN", "cf4PL", "cf5PL"):
+        start_time = time.time()
+        par_models = batch_interpolation_eng(dat_models=[run_step_1[6] for plate_id, run_step_1 in plates], order=order,
+                                             param_range=param_range, fit_store=fit_store,
+                                             legends=[run_step_1[4] for plate_id, run_step_1 in plates])
+        calc_times = [(time.time() - start_time)/len(plates)]*len(plates)
+    else:
+        par_models = []
+        calc_times = []
+        for plate_id, run_step_1 in plates:
+            start_time = time.time()
+            par_models.append(interpolation_eng(dat_model=run_step_1[6], order=order, param_range=param_range,
+                                                de_options=de_options, fit_store=fit_store, legend=run_step_1[4]))
+            calc_times.append(time.time() - start_time)
+    results = []
+    for (plate_id, run_step_1), par_model, calc_time in zip(plates, par_models, calc_times):
+        plate_name = r_name + plate_id + '_'
+        plate_order = fitted_order(par_model, order)
+        error_info = fit_error_info(par_model)
+        if error_info is None:
+            make_report(std_mat=run_step_1[2], X_std=run_step_1[6][0], Y_std=run_step_1[6][1], param=par_model,
+                        res_folder=res_folder, r_name=plate_name, meas_res=run_step_1[0], data_map=run_step_1[1],
+                        data_standards=run_step_1[2], data_standards_for_rep=run_step_1[3], specification=run_step_1[5],
+                        pdf_leg=run_step_1[4], licence_notice=licence_notice, order_model=plate_order, cal_time=calc_time,
+                        plate=run_step_1[7],
+                        bootstrap=bootstrap_eng(run_step_1, par_model, plate_order, param_range, boot_options))
+        else:
+            pdf.rep_error_csv(rep_name=plate_name, p_folder=res_folder, parameters=par_model, order=plate_order,
+                              error_info=error_info)
+        results.append((plate_id, par_model))
+    """returns list of tuples (plate_id, fitted model parameters)"""
+    return results
@@ -16,11 +16,12 @@ __maintainer__ = "Grzegorz Banach"
 __email__ = "g.banach@physiolution.pl"
 __status__ = "Production"
 
-from weasyprint import HTML
 import datetime
 import pandas as pd
 import textwrap
 from os import remove
+import elisa_tool_repo.et_calc as ecf
+from elisa_tool_repo.et_result import FitResult
 
 def rej_samples_html_table(D_sam):
     """
@@ -35,11 +36,12 @@ def rej_samples_html_table(D_sam):
     return(html_table)
 
 
-def rep_html_table(D_sam):
+def rep_html_table(D_sam, bootstrap=None):
     """
     The function was implemented to create a HTML-table named "Calculation results" from the list of list containing the data about sample names,
     titer concentration, bottom edge ot titer concentration standard deviation, top edge of titer concentration standard deviation, sample absorbance
-    value and simmetrical value of absorbance standard deviation.
+    value, simmetrical value of absorbance standard deviation and the bounds of the concentration confidence interval (et_calc.CI_LEVEL),
+    followed by the bootstrap interval of the concentration if the bootstrap summary (et_boot.bootstrap) is given.
     """
     g_names=D_sam[0]
     concentration_X=D_sam[1]
@@ -54,6 +56,9 @@ def rep_html_table(D_sam):
     dftable["C_SD_up"]=conc_st_dev_upper
     dftable["Absorbance_Y_axis"]=intensity_Y
     dftable["Abs_st_dev"]=abs_st_dev
+    dftable["C_CI_bot"]=D_sam[10]
+    dftable["C_CI_up"]=D_sam[11]
+    bootstrap_columns(dftable, bootstrap, ["C_BS_bot", "C_BS_up", "C_BS_finite", "C_BS_err"])
     dftable.sort_values(by=["good_sample_names"], inplace=True)
     dftable.set_index(['good_sample_names'], inplace=True)
     
@@ -62,10 +67,72 @@ def rep_html_table(D_sam):
     return(ln_html_table)
 
 
-def rep_csv_order(D_sam, rep_name, i_data, i_data_map, d_st, p_folder, parameters, order, cal_time):
+"""
+Search budget of the differential evolution fits (FitResult fields) and its report labels
+"""
+SEARCH_BUDGET_LABELS = [('de_popsize', 'DE population size'), ('de_maxiter', 'DE generations limit'), ('generations', 'DE generations used')]
+
+def search_budget(fit):
+    """
+    The function was implemented to collect the search budget of the fit for the reports (empty list for curve_fit models).
+    """
+    """returns list of tuples (report label, value)"""
+    return [(label, int(getattr(fit, name))) for name, label in SEARCH_BUDGET_LABELS if getattr(fit, name) is not None]
+
+def model_selection(fit):
+    """
+    The function was implemented to collect the model ranking of the auto mode for the reports (empty list for the chosen models).
+    """
+    if fit.auto_ranking is None:
+        return []
+    """returns list of tuples (report label, value)"""
+    return [('Model selection (auto)', fit.auto_ranking)]
+
+def bootstrap_summary(bootstrap):
+    """
+    The function was implemented to collect the bootstrap summary (et_boot.bootstrap) for the reports: the number of the refits
+    used of the requested ones (with the refits that did not converge), the time and the percentile interval of every model
+    parameter and the samples without the concentration interval; an invalid bootstrap (too many refits did not converge) is reported
+    without the intervals (empty list without the bootstrap).
+    """
+    if bootstrap is None:
+        return []
+    interval = '%g-%g%%' % tuple(bootstrap['percentiles'])
+    rows = [('Bootstrap replicates', '%d used / %d requested (%d of %d run did not converge)'
+             % (bootstrap['replicates'], bootstrap['requested'], bootstrap['attempted'] - bootstrap['converged'],
+                bootstrap['attempted'])),
+            ('Bootstrap time', '%.3f [s]' % bootstrap['calc_time'])]
+    if not bootstrap['valid']:
+        rows.append(('Bootstrap', 'invalid - too many refits did not converge, no intervals reported'))
+        return rows
+    rows.extend(('Bootstrap ' + name + ' (' + interval + ')', '%.6f - %.6f' % (row['lower'], row['upper']))
+                for name, row in bootstrap['params'].iterrows())
+    conc = bootstrap['concentration']
+    out_of_range = list(conc.index[conc['error'] == 1])
+    if out_of_range:
+        rows.append(('Bootstrap samples without interval', '%d (out of the range of too many refitted curves): %s'
+                     % (len(out_of_range), ' '.join(out_of_range))))
+    """returns list of tuples (report label, value)"""
+    return rows
+
+def bootstrap_columns(dftable, bootstrap, names):
+    """
+    The function was implemented to add the bootstrap interval of the concentration of the good samples to the calculation results table:
+    names of the lower and upper bound, of the fraction of the refits in which the sample was back-calculated and of the error flag
+    (interval NaN, the sample was out of the range of too many refitted curves).
+    """
+    if bootstrap is None:
+        return
+    """the intervals of an invalid bootstrap are NaN"""
+    conc = bootstrap['concentration'].reindex(dftable["good_sample_names"])
+    for name, column in zip(names, ['lower', 'upper', 'finite', 'error']):
+        dftable[name] = conc[column].values
+
+def rep_csv_order(D_sam, rep_name, i_data, i_data_map, d_st, p_folder, parameters, order, cal_time, bootstrap=None):
     """
     The function was implemented to create and save csv report for 5PL model.
     """
+    fit = FitResult.of(parameters, ecf.model_family(order))
     g_names=D_sam[0]
     concentration_X=D_sam[1]
     conc_st_dev_bottom= D_sam[5]
@@ -81,6 +148,9 @@ def rep_csv_order(D_sam, rep_name, i_data, i_data_map, d_st, p_folder, parameter
     dftable["c_st_dev_up"]=conc_st_dev_upper
     dftable["Absorbance_Y_axis"]=intensity_Y
     dftable["Abs_st_dev"]=abs_st_dev
+    dftable["c_ci_bo"]=D_sam[10]
+    dftable["c_ci_up"]=D_sam[11]
+    bootstrap_columns(dftable, bootstrap, ["c_bs_bo", "c_bs_up", "c_bs_finite", "c_bs_err"])
     dftable.sort_values(by=["good_sample_names"], inplace=True)
     dftable.set_index(['good_sample_names'], inplace=True)
     
@@ -100,40 +170,42 @@ def rep_csv_order(D_sam, rep_name, i_data, i_data_map, d_st, p_folder, parameter
     s_csv_d_st=d_st.to_csv(path_or_buf=None)
     
     doc_structure='Initial measurement results'+ '\r\n'+ s_csv_i_data + '\r\n'+ 'Multiwell plate map' +'\r\n'+s_csv_i_data_map + \
-        '\r\n'+ 'Calibration standards'+'\r\n'+ s_csv_d_st + '\r\n'+ 'Calculation results'+'\r\n'+s_csv_res + '\r\n'+ 'BLQ samples'+ \
+        '\r\n'+ 'Calibration standards'+'\r\n'+ s_csv_d_st + '\r\n'+ 'Calculation results (c_ci - ' + str(int(round(100*ecf.CI_LEVEL))) + '% confidence interval of the concentration)'+'\r\n'+s_csv_res + '\r\n'+ 'BLQ samples'+ \
         '\r\n'+s_csv_rej
     
-    if ((order=="LN") or (order=="cfLN")):
-        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(parameters[3][1],8))+ '\r\n'\
-                        +'Akaike Information Criterion AIC,'+ str(round(parameters[4][1],8))+ '\r\n'\
-                        +'Bayesian Information Criterion BIC,'+ str(round(parameters[5][1],8))+ '\r\n'\
-                        +'Coefficient of Correlation r,'+ str(round(parameters[6][1],8))+ '\r\n'\
-                        +'The Residual Sum of Squares RSS,' + str(round(parameters[2][1],8))+'\r\n'\
+    budget_csv=''.join('\r\n' + label + ',' + str(value) for label, value in search_budget(fit) + model_selection(fit) + bootstrap_summary(bootstrap))
+
+    if (ecf.model_family(order)=="LN"):
+        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(fit.r_squ,8))+ '\r\n'\
+                        +'Akaike Information Criterion AIC,'+ str(round(fit.aic,8))+ '\r\n'\
+                        +'Bayesian Information Criterion BIC,'+ str(round(fit.bic,8))+ '\r\n'\
+                        +'Coefficient of Correlation r,'+ str(round(fit.r_corre,8))+ '\r\n'\
+                        +'The Residual Sum of Squares RSS,' + str(round(fit.rss,8))+'\r\n'\
                         +'\r\n' + 'Absorbance=A*ln(Conc)+B' + '\r\n'\
-                        +'A,' + str(round(parameters[0][1],8))+'\r\n'\
-                        +'B,'+ str(round(parameters[1][1],8)) + '\r\n'\
-                        +'Time of calculation,' + str(round(cal_time,6))
+                        +'A,' + str(round(fit.param('A'),8))+'\r\n'\
+                        +'B,'+ str(round(fit.param('B'),8)) + '\r\n'\
+                        +'Time of calculation,' + str(round(cal_time,6)) + budget_csv
 
-    if ((order=="4PL") or (order=="cf4PL")):
-        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(parameters[5][1],8))+ '\r\n'\
-                        +'Akaike Information Criterion AIC,'+ str(round(parameters[6][1],8))+ '\r\n'\
-                        +'Bayesian Information Criterion BIC,'+ str(round(parameters[7][1],8))+ '\r\n'\
-                        +'Coefficient of Correlation r,'+ str(round(parameters[8][1],8))+ '\r\n'\
-                        +'The Residual Sum of Squares RSS,' + str(round(parameters[4][1],8))+'\r\n'\
+    if (ecf.model_family(order)=="4PL"):
+        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(fit.r_squ,8))+ '\r\n'\
+                        +'Akaike Information Criterion AIC,'+ str(round(fit.aic,8))+ '\r\n'\
+                        +'Bayesian Information Criterion BIC,'+ str(round(fit.bic,8))+ '\r\n'\
+                        +'Coefficient of Correlation r,'+ str(round(fit.r_corre,8))+ '\r\n'\
+                        +'The Residual Sum of Squares RSS,' + str(round(fit.rss,8))+'\r\n'\
                         + 'Absorbance=D+((A-D)/(1+(Conc/C)^B)'+'\r\n'\
-                        + 'D,' + str(round(parameters[0][1],8))+'\r\n' + 'A,'+str(round(parameters[1][1],8)) + '\r\n' + 'B,' + str(round(parameters[2][1],8))+'\r\n'+'C,'+str(round(parameters[3][1],8)) + '\r\n'\
-                        +'Time of calculation,' + str(round(cal_time,6))
+                        + 'D,' + str(round(fit.param('D'),8))+'\r\n' + 'A,'+str(round(fit.param('A'),8)) + '\r\n' + 'B,' + str(round(fit.param('B'),8))+'\r\n'+'C,'+str(round(fit.param('C'),8)) + '\r\n'\
+                        +'Time of calculation,' + str(round(cal_time,6)) + budget_csv
 
-    if ((order=="5PL") or (order=="cf5PL")):
-        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(parameters[6][1],8)) + '\r\n'\
-                        +'Akaike Information Criterion AIC,'+ str(round(parameters[7][1],8))+ '\r\n'\
-                        +'Bayesian Information Criterion BIC,'+ str(round(parameters[8][1],8))+ '\r\n'\
-                        +'Coefficient of Correlation r,'+ str(round(parameters[9][1],8))+ '\r\n'\
-                        +'The Residual Sum of Squares RSS,' + str(round(parameters[5][1],8))+'\r\n'\
+    if (ecf.model_family(order)=="5PL"):
+        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(fit.r_squ,8)) + '\r\n'\
+                        +'Akaike Information Criterion AIC,'+ str(round(fit.aic,8))+ '\r\n'\
+                        +'Bayesian Information Criterion BIC,'+ str(round(fit.bic,8))+ '\r\n'\
+                        +'Coefficient of Correlation r,'+ str(round(fit.r_corre,8))+ '\r\n'\
+                        +'The Residual Sum of Squares RSS,' + str(round(fit.rss,8))+'\r\n'\
                         +'\r\n' + 'Absorbance=D+((A-D)/(1+(Conc/C)^B)^E)'+'\r\n'\
-                        +'D,' + str(round(parameters[0][1],8)) + '\r\n' + 'A,'+ str(round(parameters[1][1],8)) + '\r\n'\
-                        +'B,' + str(round(parameters[2][1],8)) + '\r\n' + 'C,'+ str(round(parameters[3][1],8)) + '\r\n' + 'E,' + str(round(parameters[4][1],8)) + '\r\n'\
-                        +'Time of calculation,' + str(round(cal_time,6))
+                        +'D,' + str(round(fit.param('D'),8)) + '\r\n' + 'A,'+ str(round(fit.param('A'),8)) + '\r\n'\
+                        +'B,' + str(round(fit.param('B'),8)) + '\r\n' + 'C,'+ str(round(fit.param('C'),8)) + '\r\n' + 'E,' + str(round(fit.param('E'),8)) + '\r\n'\
+                        +'Time of calculation,' + str(round(cal_time,6)) + budget_csv
     
     file= open(p_folder + '/' + rep_name + '_' + order + '_' + ts_name + "_data.csv","w")
     file.write(s)
@@ -143,36 +215,37 @@ def rep_error_csv(rep_name, p_folder,parameters, order, error_info):
     """
     The function was implemented to create and save csv report for 5PL model.
     """
+    fit = FitResult.of(parameters, ecf.model_family(order))
     doc_structure = error_info + '\r\n Results: '
     
-    if ((order == "LN") or (order == "cfLN")):
-        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(parameters[3][1],8)) + '\r\n'\
-                        +'Akaike Information Criterion AIC,'+ str(round(parameters[4][1],8)) + '\r\n'\
-                        +'Bayesian Information Criterion BIC,'+ str(round(parameters[5][1],8)) + '\r\n'\
-                        +'Coefficient of Correlation r,'+ str(round(parameters[6][1],8)) + '\r\n'\
-                        +'The Residual Sum of Squares RSS,' + str(round(parameters[2][1],8)) +'\r\n'\
+    if (ecf.model_family(order)=="LN"):
+        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(fit.r_squ,8)) + '\r\n'\
+                        +'Akaike Information Criterion AIC,'+ str(round(fit.aic,8)) + '\r\n'\
+                        +'Bayesian Information Criterion BIC,'+ str(round(fit.bic,8)) + '\r\n'\
+                        +'Coefficient of Correlation r,'+ str(round(fit.r_corre,8)) + '\r\n'\
+                        +'The Residual Sum of Squares RSS,' + str(round(fit.rss,8)) +'\r\n'\
                         +'\r\n' + 'Absorbance=A*ln(Conc)+B' + '\r\n'\
-                        +'A,' + str(round(parameters[0][1],8)) +'\r\n'\
-                        +'B,'+ str(round(parameters[1][1],8))
+                        +'A,' + str(round(fit.param('A'),8)) +'\r\n'\
+                        +'B,'+ str(round(fit.param('B'),8))
 
-    if ((order == "4PL") or (order == "cf4PL")):
-        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(parameters[5][1],8)) + '\r\n'\
-                        +'Akaike Information Criterion AIC,'+ str(round(parameters[6][1],8)) + '\r\n'\
-                        +'Bayesian Information Criterion BIC,'+ str(round(parameters[7][1],8)) + '\r\n'\
-                        +'Coefficient of Correlation r,'+ str(round(parameters[8][1],8)) + '\r\n'\
-                        +'The Residual Sum of Squares RSS,' + str(round(parameters[4][1],8)) +'\r\n'\
+    if (ecf.model_family(order)=="4PL"):
+        s=doc_structure + '\r\n'+'Coefficient of Determination R^2,'+ str(round(fit.r_squ,8)) + '\r\n'\
+                        +'Akaike Information Criterion AIC,'+ str(round(fit.aic,8)) + '\r\n'\
+                        +'Bayesian Information Criterion BIC,'+ str(round(fit.bic,8)) + '\r\n'\
+                        +'Coefficient of Correlation r,'+ str(round(fit.r_corre,8)) + '\r\n'\
+                        +'The Residual Sum of Squares RSS,' + str(round(fit.rss,8)) +'\r\n'\
                         + 'Absorbance=D+((A-D)/(1+(Conc/C)^B)' + '\r\n'\
-                        + 'D,' + str(round(parameters[0][1],8)) + '\r\n' + 'A,'+str(round(parameters[1][1],8)) + '\r\n' + 'B,' + str(round(parameters[2][1],8))+'\r\n'+'C,'+str(round(parameters[3][1],8))
+                        + 'D,' + str(round(fit.param('D'),8)) + '\r\n' + 'A,'+str(round(fit.param('A'),8)) + '\r\n' + 'B,' + str(round(fit.param('B'),8))+'\r\n'+'C,'+str(round(fit.param('C'),8))
 
-    if ((orde r== "5PL") or (order == "cf5PL")):
-        s=doc_structure + '\r\n' + 'Coefficient of Determination R^2,' + str(round(parameters[6][1],8)) + '\r\n'\
-                        +'Akaike Information Criterion AIC,' + str(round(parameters[7][1],8)) + '\r\n'\
-                        +'Bayesian Information Criterion BIC,' + str(round(parameters[8][1],8)) + '\r\n'\
-                        +'Coefficient of Correlation r,' + str(round(parameters[9][1],8)) + '\r\n'\
-                        +'The Residual Sum of Squares RSS,' + str(round(parameters[5][1],8)) +'\r\n'\
+    if (ecf.model_family(order)=="5PL"):
+        s=doc_structure + '\r\n' + 'Coefficient of Determination R^2,' + str(round(fit.r_squ,8)) + '\r\n'\
+                        +'Akaike Information Criterion AIC,' + str(round(fit.aic,8)) + '\r\n'\
+                        +'Bayesian Information Criterion BIC,' + str(round(fit.bic,8)) + '\r\n'\
+                        +'Coefficient of Correlation r,' + str(round(fit.r_corre,8)) + '\r\n'\
+                        +'The Residual Sum of Squares RSS,' + str(round(fit.rss,8)) +'\r\n'\
                         +'\r\n' + 'Absorbance=D+((A-D)/(1+(Conc/C)^B)^E)' + '\r\n'\
-                        +'D,' + str(round(parameters[0][1],8)) + '\r\n' + 'A,'+ str(round(parameters[1][1],8)) + '\r\n'\
-                        +'B,' + str(round(parameters[2][1],8)) + '\r\n' + 'C,'+ str(round(parameters[3][1],8)) + '\r\n' + 'E,' + str(round(parameters[4][1],8)) 
+                        +'D,' + str(round(fit.param('D'),8)) + '\r\n' + 'A,'+ str(round(fit.param('A'),8)) + '\r\n'\
+                        +'B,' + str(round(fit.param('B'),8)) + '\r\n' + 'C,'+ str(round(fit.param('C'),8)) + '\r\n' + 'E,' + str(round(fit.param('E'),8)) 
 
     ts=datetime.datetime.now()
     ts_name=ts.strftime("%d_%b_%Y_%H_%M")
@@ -183,10 +256,12 @@ def rep_error_csv(rep_name, p_folder,parameters, order, error_info):
 
     
 def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_name, D_samples, 
-                             parameters, legend, plot_name1, spec, notice, order, cal_time):
+                             parameters, legend, plot_name1, spec, notice, order, cal_time, bootstrap=None):
     """
     The function was implemented in order to create logarithmic model pdf-report with the help of the functions from weasyprint module.
     """
+    fit = FitResult.of(parameters, ecf.model_family(order))
+    from weasyprint import HTML
     #variables definitions
     ts=datetime.datetime.now()
     ts1=ts.strftime("%d.%m.%Y %H:%M")
@@ -208,17 +283,17 @@ def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_nam
         s71=textwrap.wrap(text=notice, width=99)
         notice= ' \A '.join(s71)
         
-    if ((order=="LN") or (order=="cfLN")):
+    if (ecf.model_family(order)=="LN"):
         core_name="_" + order + "_out_report_"
         report_name="Logarithmic"
         formula="Absorbance=A*ln(Conc)+B"
 
-    if ((order=="4PL") or (order=="cf4PL")):
+    if (ecf.model_family(order)=="4PL"):
         core_name="_logit_" + order + "_out_report_"
         report_name="Logit " + order
         formula="Absorbance=D+((A-D)/(1+(Conc/C)^B)"
 
-    if ((order=="5PL") or (order=="cf5PL")):
+    if (ecf.model_family(order)=="5PL"):
         core_name="_logit_" + order + "_out_report_"
         report_name="Logit " + order
         formula="Absorbance=D+((A-D)/(1+(Conc/C)^B)^E)"
@@ -228,7 +303,7 @@ def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_nam
     d_st=d_st.to_html()
     
     
-    g_sample_table=rep_html_table(D_sam= D_samples)
+    g_sample_table=rep_html_table(D_sam= D_samples, bootstrap=bootstrap)
     rej_sam= rej_samples_html_table(D_sam= D_samples)
     spec_html_table=spec.to_html()
     
@@ -259,7 +334,11 @@ def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_nam
         """).format(spec_html=spec_html_table, exdate=expdate, proj_name=projname,  uname=username, tno= test_no, timestamp1=ts1, 
                      timestamp=ts1, data_in=i_data, data_map=i_data_map, cal_st=d_st)
     
-    if ((order=="LN") or (order=="cfLN")):     
+    budget_html=''.join("""
+                                           {label:<35}={value}<br>""".format(label=label, value=value)
+                        for label, value in search_budget(fit) + model_selection(fit) + bootstrap_summary(bootstrap))
+
+    if (ecf.model_family(order)=="LN"):     
         sb=("""
             <div class="elem">
                 <h2>Model: {R_name} fitting</h2>
@@ -278,13 +357,13 @@ def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_nam
                                            Akaike Information Criterion AIC   ={AIC:.6f}<br>
                                            Bayesian Information Criterion BIC ={BIC:.6f}<br>
                                            Coefficient of Correlation r       ={rcc:.6f}<br>
-                                           Time of calculatin                 ={cal_time:.6f} [s]<br>
+                                           Time of calculatin                 ={cal_time:.6f} [s]<br>{budget}
                 </p>
             </div>
-            """).format(R_name=report_name, form=formula, rss=parameters[2][1], rsq=parameters[3][1], AIC=parameters[4][1], BIC=parameters[5][1], rcc=parameters[6][1], \
-                                      A=parameters[0][1], B=parameters[1][1], cal_time=cal_time)
+            """).format(R_name=report_name, form=formula, rss=fit.rss, rsq=fit.r_squ, AIC=fit.aic, BIC=fit.bic, rcc=fit.r_corre, \
+                                      A=fit.param('A'), B=fit.param('B'), cal_time=cal_time, budget=budget_html)
 
-    if ((order=="4PL") or (order=="cf4PL")): 
+    if (ecf.model_family(order)=="4PL"): 
         sb=("""
             <div class="elem">
                 <h2>Model: {R_name} fitting</h2>
@@ -304,13 +383,13 @@ def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_nam
                                            Akaike Information Criterion AIC   ={AIC:.6f}<br>
                                            Bayesian Information Criterion BIC ={BIC:.6f}<br>
                                            Coefficient of Correlation r       ={rcc:.6f}<br>
-                                           Time of calculatin                 ={cal_time:.6f} [s]<br>
+                                           Time of calculatin                 ={cal_time:.6f} [s]<br>{budget}
                 </p>
           </div>
-            """).format(R_name=report_name, form=formula, rss=parameters[4][1], rsq=parameters[5][1], AIC=parameters[6][1], BIC=parameters[7][1], rcc=parameters[8][1], \
-                                      D=parameters[0][1], A=parameters[1][1], B=parameters[2][1], C=parameters[3][1], cal_time=cal_time)
+            """).format(R_name=report_name, form=formula, rss=fit.rss, rsq=fit.r_squ, AIC=fit.aic, BIC=fit.bic, rcc=fit.r_corre, \
+                                      D=fit.param('D'), A=fit.param('A'), B=fit.param('B'), C=fit.param('C'), cal_time=cal_time, budget=budget_html)
 
-    if ((order=="5PL") or (order=="cf5PL")): 
+    if (ecf.model_family(order)=="5PL"): 
         sb=("""
           <div class="elem">
                 <h2>Model: {R_name} fitting</h2>
@@ -327,10 +406,10 @@ def pdf_report_generation(rep_name, i_data, i_data_map, d_st, p_folder, plot_nam
                                            Akaike Information Criterion AIC   ={AIC:.6f}<br>
                                            Bayesian Information Criterion BIC ={BIC:.6f}<br>
                                            Coefficient of Correlation r       ={rcc:.6f}<br>                 
-                                           Time of calculatin                 ={cal_time:.6f} [s]<br>
+                                           Time of calculatin                 ={cal_time:.6f} [s]<br>{budget}
           </div>
-            """).format(R_name=report_name, form=formula, rss=parameters[5][1], rsq=parameters[6][1], AIC=parameters[7][1], BIC=parameters[8][1], rcc=parameters[9][1], \
-                                      D=parameters[0][1], A=parameters[1][1], B=parameters[2][1], C=parameters[3][1], E=parameters[4][1], cal_time=cal_time)
+            """).format(R_name=report_name, form=formula, rss=fit.rss, rsq=fit.r_squ, AIC=fit.aic, BIC=fit.bic, rcc=fit.r_corre, \
+                                      D=fit.param('D'), A=fit.param('A'), B=fit.param('B'), C=fit.param('C'), E=fit.param('E'), cal_time=cal_time, budget=budget_html)
                  
     sc=("""
           <div class="elem">
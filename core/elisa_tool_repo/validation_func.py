@@ -16,11 +16,9 @@ __email__ = "g.banach@physiolution.pl"
 __status__ = "Production"
 
 import elisa_tool_repo.et_calc as ecf
+import elisa_tool_repo.et_optim as eto
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import pearsonr
-from RegscorePy import *
 
 
 def plot_init():
@@ -30,6 +28,7 @@ def plot_init():
     input: none
     output: handle for figure
     '''
+    import matplotlib.pyplot as plt
     paperheight = 8.4
     paperwidth = 16.8
     margin = 1.0
@@ -158,6 +157,7 @@ def validation_cf5PL(noise_par, point_par):
     return val_export,par_model_val
 
 def validation_eng(option, noise, points, val_report):
+    import matplotlib.pyplot as plt
     
     x_thoer = np.arange(0.0, 1.0, (1.0/(20.0*points)))
     
@@ -189,9 +189,7 @@ def validation_eng(option, noise, points, val_report):
     y_test = val_export_csv['y_valres']
     Y_st = val_export_csv['y_val']
     # Czy na pewno tutaj?  A moze w funkcji nizej?
-    akaike_crit = aic.aic(y=Y_st, y_pred=y_test, p=no_param)
-    bayes_crit = bic.bic(y=Y_st, y_pred=y_test, p=no_param)
-    r, prob = pearsonr(Y_st, y_test)
+    sse, r_squ, akaike_crit, bayes_crit, r = eto.fit_metrics(Y_st, y_test, no_param)
 
     file_name = val_report + "/validation_" + option + str(noise) + "_" + str(points)
 
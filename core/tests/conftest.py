@@ -0,0 +1,5 @@
+import os
+import sys
+
+"""the tests import the plugin modules as elisa_tool_repo.* (as elisa_tool_plug.py does)"""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+"""
+Bootstrap of the sample concentrations (et_boot.bootstrap): samples that are out of the range of too many of the
+refitted curves get no interval and the error flag, instead of percentiles of the few back-calculated values.
+"""
+import numpy as np
+import pandas as pd
+import elisa_tool_repo.et_boot as etb
+import elisa_tool_repo.et_optim as eto
+from elisa_tool_repo.et_plate import Plate
+from elisa_tool_repo.et_result import FitResult
+
+PAR = np.array([2.0, 0.1, 1.2, 5.0])     # 4PL [D, A, B, C]
+CONC = np.array([0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0])
+
+
+def synthetic_plate(seed=0):
+    """standards std1..std9 and two samples in triplicate: sam1 in the middle, sam2 at the upper asymptote D"""
+    rng = np.random.RandomState(seed)
+    labels = ['std%d' % (k + 1) for k in range(len(CONC))] + ['sam1', 'sam2']
+    truth = list(eto.logit_4PL_model(PAR[None, :], CONC)[0]) + [1.0, PAR[0]]
+    absorbance = np.repeat(truth, 3) + 0.02*rng.randn(3*len(truth))
+    order = sorted(labels)
+    codes = np.repeat([order.index(label) for label in labels], 3)
+    plate = Plate(absorbance=absorbance, codes=codes, labels=order, shape=(3, len(labels)))
+    d_st = pd.DataFrame({'conc': CONC}, index=pd.Index(labels[:len(CONC)], name='name'))
+    return plate, d_st
+
+
+def run_bootstrap(min_converged=0.9):
+    plate, d_st = synthetic_plate()
+    bounds = [(0.0, 10.0), (0.0, 5.0), (0.0, 20.0), (0.0, 300.0)]
+    return etb.bootstrap(plate, d_st, FitResult('4PL', PAR), bounds,
+                         dict(replicates=200, batch=50, seed=1, min_converged=min_converged))
+
+
+def test_sample_near_asymptote_has_no_interval():
+    conc = run_bootstrap()['concentration']
+    assert conc.loc['sam2', 'finite'] < 0.9
+    assert conc.loc['sam2', 'error'] == 1
+    assert np.all(np.isnan(conc.loc['sam2', ['lower', 'median', 'upper']].values.astype(float)))
+
+
+def test_sample_in_range_has_interval():
+    conc = run_bootstrap()['concentration']
+    assert conc.loc['sam1', 'finite'] == 1.0
+    assert conc.loc['sam1', 'error'] == 0
+    assert conc.loc['sam1', 'lower'] < conc.loc['sam1', 'median'] < conc.loc['sam1', 'upper']
+
+
+def test_percentile_table_flags_columns_below_min_finite():
+    values = np.array([[1.0, np.nan], [2.0, np.nan], [3.0, 7.0], [4.0, np.nan]])
+    table = etb.percentile_table(values, ['a', 'b'], [2.5, 97.5], min_finite=0.5)
+    assert list(table['finite']) == [1.0, 0.25]
+    assert list(table['error']) == [0, 1]
+    assert np.isnan(table.loc['b', 'median'])
+    assert table.loc['a', 'median'] == 2.5
@@ -0,0 +1,39 @@
+"""
+Closed-form Jacobians of the LN, 4PL and 5PL models (et_optim.MODELS) against central finite differences
+(et_optim.jacobian_check), at ordinary parameters and near the asymptotes of the curves.
+"""
+import numpy as np
+import pytest
+import elisa_tool_repo.et_optim as eto
+
+TOLERANCE = 1e-5
+
+X_LN = np.logspace(-5, 2, 40)
+X_PL = np.concatenate([[0.0], np.logspace(-4, 3, 40)])
+
+POINTS = [
+    ('LN', [0.55, 1.22], X_LN),
+    ('LN', [-0.04, 0.4], X_LN),
+    ('LN', [1e-4, 50.0], X_LN),
+    ('4PL', [1.0, 0.001, 4.5, 0.5], X_PL),
+    ('4PL', [0.68, 0.057, 1.03, 0.48], X_PL),
+    ('4PL', [2.0, 0.1, 0.3, 100.0], X_PL),        # x << C: curve at the A asymptote
+    ('4PL', [2.0, 0.1, 1.5, 1e-3], X_PL),         # x >> C: curve at the D asymptote
+    ('4PL', [0.1, 2.0, 12.0, 1.0], X_PL),         # steep, decreasing curve
+    ('5PL', [1.0, 0.001, 4.5, 0.5, 2.4], X_PL),
+    ('5PL', [0.58, 0.056, 0.88, 45.4, 1.0], X_PL),
+    ('5PL', [2.0, 0.1, 1.5, 1e-3, 0.2], X_PL),    # x >> C, small asymmetry
+    ('5PL', [2.0, 0.1, 0.8, 50.0, 20.0], X_PL),   # large asymmetry
+]
+
+
+@pytest.mark.parametrize('model, par, x_val', POINTS)
+def test_jacobian_matches_finite_differences(model, par, x_val):
+    assert eto.jacobian_check(model, par, x_val) <= TOLERANCE
+
+
+@pytest.mark.parametrize('model, par, x_val', POINTS)
+def test_jacobian_shape_and_finite(model, par, x_val):
+    jac = eto.MODELS[model][3](np.asarray(par, dtype='float64')[None, :], x_val)
+    assert jac.shape == (1, len(x_val), len(eto.MODELS[model][0]))
+    assert np.all(np.isfinite(jac))